@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements the benchmarks of the test case and its API on a
+small stand-in model (see ``model/``), so that they run without the AHU
+library. Results are written as json and compared with a recorded baseline
+using the regression thresholds of ``thresholds.json``.
+
+Usage: python bench.py [--output <results>] [--baseline <results>]
+                       [--thresholds <thresholds>] [--quick]
+
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+# Modules of the test case, in the repository or in the container
+sys.path[:0] = [os.path.join(here, '..', 'model'), os.path.join(here, '..')]
+# Library of the stand-in model
+os.environ['MODELICAPATH'] = os.pathsep.join(
+    [os.path.join(here, 'model')] + [p for p in os.environ.get('MODELICAPATH', '').split(os.pathsep) if p])
+
+timer = getattr(time, 'perf_counter', time.time)
+
+# Control inputs written at every step
+inputs = {'zon1_set_u':294.65, 'zon1_set_activate':1}
+
+# Seconds to wait for the default session of a test client
+startup_timeout = 600
+
+
+def configuration(work, **options):
+    '''Returns the test case configuration of the stand-in model.
+
+    Parameters
+    ----------
+    work : string
+        Working directory of the benchmarks.
+    options :
+        Entries of the configuration to set.
+
+    '''
+
+    con = {'name':'bench',
+           'fmupath':'./Bench.fmu',
+           'config':'model/config.json',
+           'model_info':'model/senario.json',
+           'model_template':'model/model.mo',
+           'model_class':'Bench',
+           'step':60,
+           'ncp':10,
+           'build_dir':os.path.join(work, 'build'),
+           'fmu_cache':{'path':os.path.join(work, 'fmu_cache')}}
+    con.update(options)
+
+    return con
+
+
+def metric(value, unit, better='lower'):
+    '''Returns a benchmark result.'''
+
+    return {'value':float(value), 'unit':unit, 'better':better}
+
+
+def timed(function, *args, **kwargs):
+    '''Returns the result of a call and its duration in seconds.'''
+
+    tic = timer()
+    result = function(*args, **kwargs)
+
+    return result, timer() - tic
+
+
+def bench_construction(work, quick):
+    '''Measures the construction of a test case, compiling and from the
+    fmu cache.'''
+
+    from testcase import TestCase
+    con = configuration(work)
+    case, compiled = timed(TestCase, con)
+    case, cached = timed(TestCase, con)
+
+    return {'construction_compile_seconds':metric(compiled, 's'),
+            'construction_cached_seconds':metric(cached, 's')}
+
+
+def bench_initialize(work, quick):
+    '''Measures the throughput of the warmup simulation.'''
+
+    from testcase import TestCase
+    case = TestCase(configuration(work))
+    warmup = 6*3600 if quick else 2*86400
+    durations = []
+    for i in range(3):
+        y, duration = timed(case.initialize, 3*86400, warmup)
+        durations.append(duration)
+
+    return {'initialize_throughput':metric(warmup/min(durations), 'simulated s/s', 'higher')}
+
+
+def bench_advance(work, quick):
+    '''Measures the latency of advance at steps of 60, 600 and 3600 s.'''
+
+    from testcase import TestCase
+    case = TestCase(configuration(work))
+    n = 20 if quick else 100
+    results = {}
+    for step in (60, 600, 3600):
+        case.set_step(step)
+        case.initialize(86400, 0)
+        latencies = []
+        for i in range(n):
+            y, duration = timed(case.advance, inputs)
+            latencies.append(duration)
+        results['advance_{}s_p50_seconds'.format(step)] = metric(np.percentile(latencies, 50), 's')
+        results['advance_{}s_p95_seconds'.format(step)] = metric(np.percentile(latencies, 95), 's')
+
+    return results
+
+
+def client(work, name, **options):
+    '''Returns a test client of the server once its default session is
+    ready, raises RuntimeError if its startup fails or times out.'''
+
+    import web
+    path = os.path.join(work, name)
+    with open(path, 'w') as f:
+        json.dump(configuration(work, **options), f)
+    app = web.create_app(path).test_client()
+    deadline = time.time() + startup_timeout
+    while True:
+        response = app.get('/ready')
+        if response.status_code == 200:
+            return app
+        status = response.get_json() or {}
+        if status.get('state') == 'failed':
+            raise RuntimeError('The startup of {} failed: {}'.format(name, status.get('error')))
+        if time.time() > deadline:
+            raise RuntimeError('The startup of {} did not finish within {} s.'.format(name, startup_timeout))
+        time.sleep(0.05)
+
+
+def bench_results(work, quick, series):
+    '''Measures the size and latency of GET results as the history grows.'''
+
+    app = client(work, 'results.json')
+    app.put('/reset', data={'start_time':86400, 'end_time':86400})
+    results = {}
+    steps = 0
+    for history in ((100, 1000) if quick else (100, 1000, 5000)):
+        app.post('/advance_batch', json={'n_steps':history - steps, 'inputs':None})
+        steps = history
+        response, duration = timed(app.get, '/results')
+        size = len(response.get_data())
+        series.append({'steps':steps, 'bytes':size, 'seconds':duration})
+        results['results_{}_steps_seconds'.format(steps)] = metric(duration, 's')
+        results['results_{}_steps_bytes'.format(steps)] = metric(size, 'bytes')
+
+    return results
+
+
+def bench_fault_scenario(work, quick):
+    '''Measures the cost of switching fault scenarios, compiling, from the
+    fmu cache and in compile-once mode.'''
+
+    results = {}
+    first = {'zon1_temp':{'value':1, 'fault_time':0}}
+    second = {'zon1_temp':{'value':2, 'fault_time':0}}
+    app = client(work, 'scenario.json')
+    response, duration = timed(app.put, '/fault_scenario', json=first)
+    results['fault_scenario_compile_seconds'] = metric(duration, 's')
+    app.put('/fault_scenario', json=second)
+    response, duration = timed(app.put, '/fault_scenario', json=first)
+    results['fault_scenario_cached_seconds'] = metric(duration, 's')
+    app = client(work, 'scenario_once.json', compile_once=True)
+    durations = []
+    for scenario in (first, second, first):
+        response, duration = timed(app.put, '/fault_scenario', json=scenario)
+        durations.append(duration)
+    results['fault_scenario_compile_once_seconds'] = metric(min(durations), 's')
+
+    return results
+
+
+def compare(results, baseline, thresholds):
+    '''Compares results with a baseline.
+
+    Parameters
+    ----------
+    results : dict
+        Benchmark results, {<name>:{'value':<value>, 'better':<lower or higher>}}.
+    baseline : dict
+        Benchmark results of the baseline.
+    thresholds : dict
+        {'tolerance':<relative tolerance>,
+         'metrics':{<name>:{'tolerance':<relative tolerance>, 'max':<limit>, 'min':<limit>}}}
+
+    Returns
+    -------
+    regressions : list
+        Descriptions of the results beyond their thresholds.
+
+    '''
+
+    regressions = []
+    for name in sorted(results):
+        result = results[name]
+        limits = thresholds.get('metrics', {}).get(name, {})
+        tolerance = limits.get('tolerance', thresholds.get('tolerance', 0.25))
+        value = result['value']
+        if 'max' in limits and value > limits['max']:
+            regressions.append('{} is {:.6g}, above the limit {:.6g}'.format(name, value, limits['max']))
+        if 'min' in limits and value < limits['min']:
+            regressions.append('{} is {:.6g}, below the limit {:.6g}'.format(name, value, limits['min']))
+        if name not in baseline:
+            continue
+        reference = baseline[name]['value']
+        if result['better'] == 'lower' and value > reference*(1 + tolerance):
+            regressions.append('{} is {:.6g}, {:.0f}% above the baseline {:.6g}'.format(
+                name, value, 100*(value/reference - 1), reference))
+        if result['better'] == 'higher' and value < reference*(1 - tolerance):
+            regressions.append('{} is {:.6g}, {:.0f}% below the baseline {:.6g}'.format(
+                name, value, 100*(1 - value/reference), reference))
+
+    return regressions
+
+
+def run(quick=False, work=None):
+    '''Runs the benchmarks.
+
+    Returns
+    -------
+    report : dict
+        {'environment':{...}, 'metrics':{<name>:<result>}, 'series':{...}}
+
+    '''
+
+    os.chdir(here)
+    work = work or os.path.join(here, 'work')
+    if os.path.isdir(work):
+        shutil.rmtree(work)
+    os.makedirs(os.path.join(work, 'build'))
+    metrics = {}
+    series = {'results':[]}
+    metrics.update(bench_construction(work, quick))
+    metrics.update(bench_initialize(work, quick))
+    metrics.update(bench_advance(work, quick))
+    metrics.update(bench_results(work, quick, series['results']))
+    metrics.update(bench_fault_scenario(work, quick))
+
+    return {'environment':{'python':platform.python_version(),
+                           'platform':platform.platform(),
+                           'date':time.strftime('%Y-%m-%dT%H:%M:%S'),
+                           'quick':quick},
+            'metrics':metrics,
+            'series':series}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmarks of the test case API.')
+    parser.add_argument('--output', default=os.path.join(here, 'results.json'))
+    parser.add_argument('--baseline', default=os.path.join(here, 'baseline.json'))
+    parser.add_argument('--thresholds', default=os.path.join(here, 'thresholds.json'))
+    parser.add_argument('--quick', action='store_true', help='fewer and shorter runs')
+    args = parser.parse_args()
+    try:
+        report = run(args.quick)
+    except RuntimeError as e:
+        sys.exit('Benchmarks failed: {}'.format(e))
+    report['regressions'] = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+        report['regressions'] = compare(report['metrics'], baseline['metrics'], thresholds)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+    for name in sorted(report['metrics']):
+        result = report['metrics'][name]
+        print('{:<45} {:>14.6g} {}'.format(name, result['value'], result['unit']))
+    for regression in report['regressions']:
+        print('REGRESSION: ' + regression)
+    sys.exit(1 if report['regressions'] else 0)
@@ -0,0 +1,43 @@
+import json
+import socket
+import struct
+
+host = '127.0.0.1'
+port = 5001
+
+def read_frame(sock):
+    data = b''
+    while len(data) < 4:
+        data += sock.recv(4 - len(data))
+    n = struct.unpack('!I', data)[0]
+    data = b''
+    while len(data) < n:
+        data += sock.recv(n - len(data))
+    return data
+
+def write_frame(sock, payload):
+    sock.sendall(struct.pack('!I', len(payload)) + payload)
+
+####################### opening the channel of the default session ######################################
+
+sock = socket.create_connection((host, port))
+sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+write_frame(sock, json.dumps({'session_id':'default'}).encode('utf-8'))
+signals = json.loads(read_frame(sock).decode('utf-8'))
+inputs = dict((name, i) for i, name in enumerate(signals['inputs']))
+measurements = signals['measurements']
+result = struct.Struct('!Bd{}d'.format(len(measurements)))
+
+####################### advancing the simulation with (input id, value) pairs ###########################
+
+for step in range(10):
+    u = {}  # {<input_name>:<value>}, empty for the default inputs
+    write_frame(sock, b''.join(struct.pack('!Hd', inputs[name], value) for name, value in u.items()))
+    frame = read_frame(sock)
+    if frame[:1] != b'\x00':
+        raise RuntimeError(frame[1:].decode('utf-8'))
+    values = result.unpack(frame)
+    y = dict(zip(measurements, values[2:]))
+    print(values[1], y)
+
+sock.close()
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements a persistent, content-addressed file cache used to
+keep compiled artifacts (e.g. FMUs) across test case constructions and
+container restarts.  Entries are evicted in least-recently-used order once
+the configured size or entry limits are exceeded.
+
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+
+def cache_key(*parts):
+    '''Computes a content hash from the given parts.
+
+    Parameters
+    ----------
+    parts : json serializable objects
+        Everything the cached artifact depends on.
+
+    Returns
+    -------
+    key : string
+        Hexadecimal sha256 digest of the parts.
+
+    '''
+
+    data = json.dumps(parts, sort_keys=True, separators=(',', ':'))
+
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def library_version(paths=None):
+    '''Computes a fingerprint of the Modelica library trees.
+
+    The fingerprint is built from the relative path, size and modification
+    time of every Modelica file, which is much cheaper than hashing the
+    content of the whole library on every construction.
+
+    Parameters
+    ----------
+    paths : list of strings, optional
+        Library directories. Default is the content of ``MODELICAPATH``.
+
+    Returns
+    -------
+    version : string
+        Hexadecimal digest identifying the library trees.
+
+    '''
+
+    if paths is None:
+        paths = [p for p in os.environ.get('MODELICAPATH', '').split(os.pathsep) if p]
+    sha = hashlib.sha256()
+    for path in sorted(set(paths)):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if not name.endswith('.mo'):
+                    continue
+                full = os.path.join(root, name)
+                try:
+                    stat = os.stat(full)
+                except OSError:
+                    continue
+                sha.update('{}:{}:{}\n'.format(os.path.relpath(full, path),
+                                               stat.st_size,
+                                               int(stat.st_mtime)).encode('utf-8'))
+
+    return sha.hexdigest()
+
+
+class FileCache(object):
+    '''Class that implements a directory of files addressed by key.
+
+    The modification time of an entry is used as its last access time, so
+    that the least recently used entries are removed first when the cache
+    grows beyond ``max_size`` bytes or ``max_entries`` files.
+
+    '''
+
+    def __init__(self, path, suffix='', max_size=None, max_entries=None):
+        '''Constructor.
+
+        Parameters
+        ----------
+        path : string
+            Directory of the cache. Created if it does not exist.
+        suffix : string, optional
+            File extension of the entries, e.g. '.fmu'.
+        max_size : int, optional
+            Maximum total size of the entries in bytes.
+            Default is None (unlimited).
+        max_entries : int, optional
+            Maximum number of entries.
+            Default is None (unlimited).
+
+        '''
+
+        self.path = path
+        self.suffix = suffix
+        self.max_size = max_size
+        self.max_entries = max_entries
+        if not os.path.isdir(self.path):
+            try:
+                os.makedirs(self.path)
+            except OSError:
+                # Created concurrently by another process
+                if not os.path.isdir(self.path):
+                    raise
+
+    def entry(self, key):
+        '''Returns the file path of the entry for key.'''
+
+        return os.path.join(self.path, key + self.suffix)
+
+    def get(self, key):
+        '''Returns the file path of a cached entry and marks it as used.
+
+        Parameters
+        ----------
+        key : string
+            Key of the entry.
+
+        Returns
+        -------
+        path : string or None
+            Path to the cached file, None if it is not in the cache.
+
+        '''
+
+        path = self.entry(key)
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+
+        return path
+
+    def put(self, key, source):
+        '''Copies a file into the cache.
+
+        Parameters
+        ----------
+        key : string
+            Key of the entry.
+        source : string
+            Path to the file to be cached.
+
+        Returns
+        -------
+        path : string
+            Path to the cached file.
+
+        '''
+
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        os.close(fd)
+        shutil.copyfile(source, tmp)
+
+        return self.__commit(key, tmp)
+
+    def put_bytes(self, key, data):
+        '''Writes data into the cache.
+
+        Parameters
+        ----------
+        key : string
+            Key of the entry.
+        data : bytes
+            Content of the entry.
+
+        Returns
+        -------
+        path : string
+            Path to the cached file.
+
+        '''
+
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+
+        return self.__commit(key, tmp)
+
+    def get_bytes(self, key):
+        '''Returns the content of a cached entry, None if not cached.'''
+
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except (IOError, OSError):
+            return None
+
+    def __commit(self, key, tmp):
+        '''Moves a temporary file in place and enforces the limits.'''
+
+        path = self.entry(key)
+        # Atomic, so concurrent readers never see a partial entry
+        os.rename(tmp, path)
+        self.evict(keep=path)
+
+        return path
+
+    def evict(self, keep=None):
+        '''Removes least recently used entries until the limits are met.
+
+        Parameters
+        ----------
+        keep : string, optional
+            Path of an entry that must not be removed.
+
+        Returns
+        -------
+        removed : list
+            Paths of the removed entries.
+
+        '''
+
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(self.suffix) or name.endswith('.tmp'):
+                continue
+            full = os.path.join(self.path, name)
+            try:
+                stat = os.stat(full)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, full))
+        entries.sort()
+        total = sum(e[1] for e in entries)
+        count = len(entries)
+        removed = []
+        for mtime, size, full in entries:
+            over_size = self.max_size is not None and total > self.max_size
+            over_count = self.max_entries is not None and count > self.max_entries
+            if not (over_size or over_count):
+                break
+            if full == keep:
+                continue
+            try:
+                os.remove(full)
+            except OSError:
+                continue
+            total -= size
+            count -= 1
+            removed.append(full)
+
+        return removed
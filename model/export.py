@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements the export of the stored results in compact binary
+formats: NumPy ``npz`` archives and, if ``pyarrow`` is installed, Arrow IPC
+streams and Parquet files.
+
+"""
+
+import io
+import json
+import numpy as np
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Content types of the export formats
+formats = {'npz':'application/octet-stream',
+           'arrow':'application/vnd.apache.arrow.stream',
+           'parquet':'application/octet-stream'}
+
+
+def signal_metadata(names, info):
+    '''Returns the metadata of signals from the test case information.
+
+    Control inputs are described by the entry of the key point they
+    overwrite, i.e. ``<key>_u`` and ``<key>_activate`` by ``<key>``.
+
+    Parameters
+    ----------
+    names : list
+        Names of the signals.
+    info : dict
+        Test case information, see senario.json.
+
+    Returns
+    -------
+    metadata : dict
+        {<name>:{'path':<path>, 'description':<description>, 'type':<type>}}
+
+    '''
+
+    metadata = {}
+    for name in names:
+        key = name
+        for suffix in ('_u', '_activate'):
+            if name.endswith(suffix) and name[:-len(suffix)] in info:
+                key = name[:-len(suffix)]
+        metadata[name] = dict(info.get(key, {}))
+
+    return metadata
+
+
+def _check(fmt):
+    '''Raises an error if the format is not available.'''
+
+    if fmt not in formats:
+        raise ValueError('Unknown format {}, use one of {}.'.format(fmt, ', '.join(sorted(formats))))
+    if fmt != 'npz' and pa is None:
+        raise ValueError('Format {} requires pyarrow to be installed.'.format(fmt))
+
+
+def export(fmt, time, columns, metadata, chunk=65536):
+    '''Serializes result trajectories.
+
+    Parameters
+    ----------
+    fmt : string
+        One of 'npz', 'arrow' or 'parquet'.
+    time : numpy array
+        Times of the samples.
+    columns : list
+        Trajectories of the signals as [(<name>, <numpy array>)].
+    metadata : dict
+        Metadata of the signals, see ``signal_metadata``.
+    chunk : int, optional
+        Number of samples per Arrow record batch or Parquet row group.
+        Default is 65536.
+
+    Returns
+    -------
+    data : iterator
+        Iterator over the serialized bytes. Arrow streams are produced one
+        record batch at a time.
+
+    '''
+
+    _check(fmt)
+    if fmt == 'npz':
+        return iter([_npz(time, columns, metadata)])
+    if fmt == 'parquet':
+        return iter([_parquet(time, columns, metadata, chunk)])
+
+    return _arrow(time, columns, metadata, chunk)
+
+
+def _npz(time, columns, metadata):
+    '''Returns the trajectories as a compressed npz archive.'''
+
+    arrays = dict(columns)
+    arrays['time'] = time
+    arrays['metadata'] = np.array(json.dumps(metadata))
+    f = io.BytesIO()
+    np.savez_compressed(f, **arrays)
+
+    return f.getvalue()
+
+
+def _schema(columns, metadata):
+    '''Returns the Arrow schema of the trajectories.'''
+
+    fields = [pa.field('time', pa.float64())]
+    fields += [pa.field(name, pa.float64()) for name, values in columns]
+
+    return pa.schema(fields, metadata={'signals':json.dumps(metadata)})
+
+
+def _batches(time, columns, schema, chunk):
+    '''Yields the trajectories as Arrow record batches.'''
+
+    for lo in range(0, max(len(time), 1), chunk):
+        arrays = [pa.array(time[lo:lo+chunk])]
+        arrays += [pa.array(values[lo:lo+chunk]) for name, values in columns]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _Drain(object):
+    '''Writable file collecting the bytes written since the last drain.'''
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def _arrow(time, columns, metadata, chunk):
+    '''Yields the trajectories as an Arrow IPC stream.'''
+
+    schema = _schema(columns, metadata)
+    sink = _Drain()
+    writer = pa.RecordBatchStreamWriter(sink, schema)
+    for batch in _batches(time, columns, schema, chunk):
+        writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def _parquet(time, columns, metadata, chunk):
+    '''Returns the trajectories as a Parquet file.'''
+
+    schema = _schema(columns, metadata)
+    f = io.BytesIO()
+    writer = pq.ParquetWriter(f, schema)
+    for batch in _batches(time, columns, schema, chunk):
+        writer.write_table(pa.Table.from_batches([batch]))
+    writer.close()
+
+    return f.getvalue()
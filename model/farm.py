@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements the scenario farm, which compiles the fmus of a list
+of fault scenarios in the background so that they can later be activated
+from the fmu cache without compiling in the request thread.
+
+"""
+
+import os
+import json
+import shutil
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+from testcase import generate_model, model_hash, cached_fmu, compile_model, _fmu_cache
+from schema import ScenarioSchema
+
+
+class ScenarioFarm(object):
+    '''Class that implements a background compilation queue of fault
+    scenarios.
+
+    Each scenario is identified by the hash of its model, i.e. the key of
+    its fmu in the fmu cache. A scenario is in one of the states
+    ``queued``, ``compiling``, ``ready`` or ``failed``.
+
+    '''
+
+    def __init__(self, con, workers=2, path='./farm'):
+        '''Constructor.
+
+        Parameters
+        ----------
+        con : dict
+            Defines the test case configuration. ``fmu_cache`` is required.
+        workers : int, optional
+            Number of concurrent compilations.
+            Default is 2.
+        path : string, optional
+            Working directory of the compilations.
+            Default is './farm'.
+
+        '''
+
+        if _fmu_cache(con) is None:
+            raise ValueError('The scenario farm requires fmu_cache to be configured.')
+        self.con = con
+        with open(con['config']) as f:
+             self.config = json.load(f)
+        with open(con['model_info']) as f:
+             self.info = json.load(f)
+        # Scenarios are converted like those of ``PUT fault_scenario``, so
+        # that both render the same model and share its cached fmu
+        self.schema = ScenarioSchema(self.info)
+        self.path = path
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        for i in range(workers):
+            worker = threading.Thread(target=self.__work)
+            worker.daemon = True
+            worker.start()
+
+    def submit(self, scenarios):
+        '''Queues the compilation of fault scenarios.
+
+        Parameters
+        ----------
+        scenarios : list
+            List of dicts that describe fault conditions, in the format of
+            ``PUT fault_scenario``, see ``ScenarioSchema``.
+
+        Returns
+        -------
+        ids : list
+            Identifiers of the scenarios.
+
+        '''
+
+        ids = []
+        for scenario in scenarios:
+            scenario = self.schema.parse(scenario)
+            model = generate_model(self.con,self.info,self.config,_copy_scenario(scenario))
+            job_id = model_hash(self.con,model)
+            with self.lock:
+                job = self.jobs.get(job_id)
+                if job is not None and job['state'] != 'failed':
+                    ids.append(job_id)
+                    continue
+                self.jobs[job_id] = {'state': 'queued', 'scenario': scenario}
+                if cached_fmu(self.con,model) is not None:
+                    self.jobs[job_id]['state'] = 'ready'
+                else:
+                    self.queue.put((job_id, model))
+            ids.append(job_id)
+
+        return ids
+
+    def status(self, job_id=None):
+        '''Returns the state of one or all scenarios.
+
+        Parameters
+        ----------
+        job_id : string, optional
+            Identifier of the scenario.
+            Default is None, all scenarios are returned.
+
+        Returns
+        -------
+        status : dict
+            {'state':<state>, 'scenario':<scenario>[, 'error':<message>]}
+            or {<id>:<status>} for all scenarios. None if the id is unknown.
+
+        '''
+
+        with self.lock:
+            if job_id is None:
+                return dict((key, dict(job)) for key, job in self.jobs.items())
+            if job_id not in self.jobs:
+                return None
+            return dict(self.jobs[job_id])
+
+    def __set_state(self, job_id, state, error=None):
+        '''Sets the state of a scenario.'''
+
+        with self.lock:
+            self.jobs[job_id]['state'] = state
+            if error is not None:
+                self.jobs[job_id]['error'] = error
+
+    def __work(self):
+        '''Compiles queued scenarios into the fmu cache.'''
+
+        while True:
+            job_id, model = self.queue.get()
+            self.__set_state(job_id, 'compiling')
+            compile_to = os.path.join(self.path, job_id)
+            try:
+                if not os.path.isdir(compile_to):
+                    os.makedirs(compile_to)
+                mopath = os.path.join(compile_to, 'test.mo')
+                with open(mopath, 'w') as f:
+                    f.write(model)
+                compile_model(self.con,model,mopath,compile_to=compile_to)
+            except Exception as e:
+                self.__set_state(job_id, 'failed', error=str(e))
+            else:
+                self.__set_state(job_id, 'ready')
+            finally:
+                shutil.rmtree(compile_to, ignore_errors=True)
+                self.queue.task_done()
+
+
+def _copy_scenario(scenario):
+    '''Returns a copy of a parsed scenario.'''
+
+    return dict((key, dict(value)) for key, value in scenario.items())
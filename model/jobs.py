@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements the jobs of the simulation server, which run slow
+operations in the background and are polled or awaited by the clients.
+
+"""
+
+import copy
+import time
+import uuid
+import threading
+import collections
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class JobManager(object):
+    '''Class that runs jobs on a pool of threads.
+
+    A job is in one of the states ``queued``, ``running``, ``done`` or
+    ``failed``. Only the most recent finished jobs are kept.
+
+    '''
+
+    def __init__(self, workers=4, history=1000):
+        '''Constructor.
+
+        Parameters
+        ----------
+        workers : int, optional
+            Number of jobs run concurrently.
+            Default is 4.
+        history : int, optional
+            Number of finished jobs kept.
+            Default is 1000.
+
+        '''
+
+        self.history = history
+        self.jobs = {}
+        self.finished = collections.deque()
+        self.condition = threading.Condition()
+        self.queue = queue.Queue()
+        for i in range(workers):
+            worker = threading.Thread(target=self.__work)
+            worker.daemon = True
+            worker.start()
+
+    def submit(self, function, args=(), lock=None, session_id=None):
+        '''Queues a job.
+
+        Parameters
+        ----------
+        function : callable
+            Function run by the job.
+        args : tuple, optional
+            Arguments of the function.
+        lock : lock, optional
+            Lock held while the function runs, e.g. the lock of a session.
+        session_id : string, optional
+            Session of the job, reported in its status.
+
+        Returns
+        -------
+        job_id : string
+            Identifier of the job.
+
+        '''
+
+        job_id = uuid.uuid4().hex
+        with self.condition:
+            self.jobs[job_id] = {'state':'queued',
+                                 'session_id':session_id,
+                                 'submitted':time.time()}
+        self.queue.put((job_id, function, args, lock))
+
+        return job_id
+
+    def status(self, job_id, wait=None):
+        '''Returns the status of a job.
+
+        Parameters
+        ----------
+        job_id : string
+            Identifier of the job.
+        wait : float, optional
+            Seconds to wait for the job to finish.
+            Default is None, the status is returned immediately.
+
+        Returns
+        -------
+        status : dict
+            {'state':<state>, 'result':<result>, 'error':<message>, ...}
+            None if the job is unknown.
+
+        '''
+
+        deadline = None if wait is None else time.time() + wait
+        with self.condition:
+            while True:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    return None
+                if job['state'] in ('done', 'failed') or deadline is None:
+                    return dict(job)
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return dict(job)
+                self.condition.wait(remaining)
+
+    def __set(self, job_id, **values):
+        '''Updates the status of a job.'''
+
+        with self.condition:
+            self.jobs[job_id].update(values)
+            if values.get('state') in ('done', 'failed'):
+                self.finished.append(job_id)
+                while len(self.finished) > self.history:
+                    self.jobs.pop(self.finished.popleft(), None)
+            self.condition.notify_all()
+
+    def __work(self):
+        '''Runs queued jobs.'''
+
+        while True:
+            job_id, function, args, lock = self.queue.get()
+            try:
+                if lock is not None:
+                    lock.acquire()
+                try:
+                    self.__set(job_id, state='running', started=time.time())
+                    # Copied before the lock is released, results such as
+                    # the measurements of a test case change with the next step
+                    result = copy.deepcopy(function(*args))
+                finally:
+                    if lock is not None:
+                        lock.release()
+            except Exception as e:
+                self.__set(job_id, state='failed', error=str(e), finished=time.time())
+            else:
+                self.__set(job_id, state='done', result=result, finished=time.time())
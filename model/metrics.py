@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements the instrumentation of the simulation steps:
+histograms of the time spent in each phase of a step and of the solver
+statistics of each simulation, rendered in the Prometheus text format.
+
+"""
+
+import bisect
+import threading
+
+# Buckets of durations in seconds
+time_buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60., 300.)
+# Buckets of solver counts
+count_buckets = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 50000, 100000)
+
+# Histogram families: name, help, buckets and label
+families = {'step_phase_seconds':('Time spent in a phase of a test case call, in seconds.', time_buckets, 'phase'),
+            'solver_steps':('Solver steps per simulation.', count_buckets, None),
+            'solver_rhs_evaluations':('Right-hand side evaluations of the solver per simulation.', count_buckets, None),
+            'solver_events':('State, time and step events per simulation.', count_buckets, None)}
+
+# Prefix of the metric names
+prefix = 'bct_'
+
+
+class Metrics(object):
+    '''Class that collects the histograms of a test case.'''
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, family, value, label=None):
+        '''Records a value.
+
+        Parameters
+        ----------
+        family : string
+            Name of the histogram family, see ``families``.
+        value : float
+            Observed value.
+        label : string, optional
+            Value of the label of the family, e.g. the phase.
+
+        '''
+
+        buckets = families[family][1]
+        with self.lock:
+            histogram = self.histograms.get((family, label))
+            if histogram is None:
+                histogram = self.histograms[(family, label)] = [[0]*(len(buckets)+1), 0., 0]
+            histogram[0][bisect.bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def snapshot(self):
+        '''Returns a copy of the histograms.
+
+        Returns
+        -------
+        histograms : dict
+            {(<family>, <label>):[<counts per bucket>, <sum>, <count>]},
+            the last count is above the largest bucket.
+
+        '''
+
+        with self.lock:
+            return dict((key, [list(counts), total, count])
+                        for key, (counts, total, count) in self.histograms.items())
+
+
+def solver_statistics(metrics, statistics):
+    '''Records the statistics of an Assimulo solver.
+
+    Parameters
+    ----------
+    metrics : Metrics
+        Histograms of the test case.
+    statistics : Statistics
+        Statistics of the solver of a simulation, e.g. ``res.solver.statistics``.
+
+    '''
+
+    def get(key):
+        try:
+            return statistics[key]
+        except (KeyError, TypeError):
+            return 0
+
+    metrics.observe('solver_steps', get('nsteps'))
+    metrics.observe('solver_rhs_evaluations', get('nfcns'))
+    metrics.observe('solver_events', get('nstateevents') + get('ntimeevents') + get('nstepevents'))
+
+
+def render(snapshots):
+    '''Renders histograms in the Prometheus text format.
+
+    Parameters
+    ----------
+    snapshots : dict
+        Histograms of each session, see ``Metrics.snapshot``.
+        {<session_id>:<histograms>}
+
+    Returns
+    -------
+    text : string
+        Prometheus text exposition of the histograms, labelled by session.
+
+    '''
+
+    lines = []
+    for family in sorted(families):
+        description, buckets, label_name = families[family]
+        name = prefix + family
+        lines.append('# HELP {} {}'.format(name, description))
+        lines.append('# TYPE {} histogram'.format(name))
+        for session_id in sorted(snapshots):
+            histograms = snapshots[session_id]
+            for key in sorted(key for key in histograms if key[0] == family):
+                counts, total, count = histograms[key]
+                labels = 'session="{}"'.format(session_id)
+                if label_name is not None:
+                    labels += ',{}="{}"'.format(label_name, key[1])
+                cumulative = 0
+                for bound, n in zip(buckets, counts):
+                    cumulative += n
+                    lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, cumulative))
+                lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(name, labels, count))
+                lines.append('{}_sum{{{}}} {}'.format(name, labels, repr(float(total))))
+                lines.append('{}_count{{{}}} {}'.format(name, labels, count))
+
+    return '\n'.join(lines) + '\n'
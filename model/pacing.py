@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements the paced run mode of the simulation server, where
+the server advances a session on its own at a multiple of real time and
+publishes the measurements of every step, while clients override inputs
+asynchronously, e.g. for the integration tests of a building management
+system.
+
+"""
+
+import time
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class PacedRun(object):
+    '''Class that advances the test case of a session in a background thread.
+
+    Each step ends no earlier than its simulated end time divided by the
+    speed factor after the start of the run, so that a factor of 1 runs in
+    real time. Steps that take longer than their share of wall-clock time
+    are not skipped; the run falls behind and reports its ``lag``.
+
+    A run is in one of the states ``running``, ``stopped``, ``finished``
+    or ``failed``.
+
+    '''
+
+    def __init__(self, sessions, session_id, speed=1., end_time=None, inputs=None, queue_size=1000):
+        '''Constructor.
+
+        Parameters
+        ----------
+        sessions : SessionManager
+            Sessions of the server.
+        session_id : string
+            Session advanced by the run.
+        speed : float, optional
+            Simulated seconds per wall-clock second, None or 0 to advance as
+            fast as possible.
+            Default is 1.
+        end_time : float, optional
+            Simulation time at which the run finishes.
+            Default is None, the run goes on until it is stopped.
+        inputs : dict, optional
+            Input overrides applied from the first step.
+            {<input_name>:<value>}
+        queue_size : int, optional
+            Number of measurements buffered per subscriber, the oldest are
+            dropped for subscribers that do not keep up.
+            Default is 1000.
+
+        '''
+
+        self.sessions = sessions
+        self.session_id = session_id
+        self.case = sessions.get(session_id)
+        self.lock = sessions.get_lock(session_id)
+        self.end_time = end_time
+        self.queue_size = queue_size
+        self.inputs = dict(inputs or {})
+        self.subscribers = []
+        self.condition = threading.Condition()
+        self.stopping = threading.Event()
+        self.state = 'running'
+        self.error = None
+        self.steps = 0
+        self.lag = 0.
+        self.y = None
+        self.set_speed(speed)
+        self.thread = threading.Thread(target=self.__run)
+        self.thread.daemon = True
+
+    def start(self):
+        '''Starts advancing the test case.'''
+
+        self.thread.start()
+
+    def stop(self, wait=True):
+        '''Stops the run at the end of the current step.'''
+
+        self.stopping.set()
+        if wait and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def set_speed(self, speed):
+        '''Sets the speed factor, the pace is measured from the next step.'''
+
+        if speed is not None and speed < 0:
+            raise ValueError('The speed factor cannot be negative.')
+        with self.condition:
+            self.speed = speed or None
+            # Wall-clock and simulation time the pace is measured from
+            self.anchor = None
+
+    def override(self, values=None, release=()):
+        '''Overrides inputs from the next step boundary on.
+
+        Parameters
+        ----------
+        values : dict, optional
+            Values of the inputs to override.
+            {<input_name>:<value>}
+        release : list, optional
+            Inputs that return to their default values.
+
+        Returns
+        -------
+        inputs : dict
+            Overridden inputs.
+
+        '''
+
+        with self.condition:
+            self.inputs.update(values or {})
+            for name in release:
+                self.inputs.pop(name, None)
+            return dict(self.inputs)
+
+    def subscribe(self):
+        '''Returns a queue that receives the measurements of every step,
+        and None once the run ends.'''
+
+        subscriber = queue.Queue(self.queue_size)
+        with self.condition:
+            if self.state != 'running':
+                subscriber.put(None)
+            self.subscribers.append(subscriber)
+
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        '''Stops publishing to a queue.'''
+
+        with self.condition:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def status(self):
+        '''Returns the state of the run.
+
+        Returns
+        -------
+        status : dict
+            {'state':<state>, 'speed':<factor>, 'end_time':<time>,
+             'steps':<steps advanced>, 'lag':<seconds behind the pace>,
+             'inputs':<overridden inputs>, 'measurements':<last measurements>,
+             'error':<message if failed>}
+
+        '''
+
+        with self.condition:
+            return {'state':self.state,
+                    'speed':self.speed,
+                    'end_time':self.end_time,
+                    'steps':self.steps,
+                    'lag':self.lag,
+                    'inputs':dict(self.inputs),
+                    'measurements':self.y,
+                    'error':self.error}
+
+    def __publish(self, y):
+        '''Sends measurements to the subscribers, None at the end of the run.'''
+
+        for subscriber in self.subscribers:
+            while True:
+                try:
+                    subscriber.put_nowait(y)
+                    break
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def __finish(self, state, error=None):
+        with self.condition:
+            self.state = state
+            self.error = error
+            self.__publish(None)
+
+    def __run(self):
+        while not self.stopping.is_set():
+            with self.condition:
+                u = dict(self.inputs)
+            try:
+                with self.lock:
+                    if self.sessions.get(self.session_id) is not self.case:
+                        return self.__finish('stopped')
+                    y = self.case.advance(u)
+            except Exception as e:
+                return self.__finish('failed', '{}: {}'.format(type(e).__name__, e))
+            if y is None:
+                return self.__finish('failed', 'Simulation failed.')
+            y = dict(y)
+            now = time.time()
+            with self.condition:
+                self.y = y
+                self.steps += 1
+                self.__publish(y)
+                if self.speed is None:
+                    delay = 0.
+                elif self.anchor is None:
+                    self.anchor = (now, y['time'])
+                    delay = 0.
+                else:
+                    delay = self.anchor[0] + (y['time'] - self.anchor[1]) / self.speed - now
+                self.lag = max(0., -delay)
+            if self.end_time is not None and y['time'] >= self.end_time:
+                return self.__finish('finished')
+            if delay > 0:
+                self.stopping.wait(delay)
+        self.__finish('stopped')
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements a pool of worker processes owning test cases, so
+that simulations of different sessions run in parallel instead of sharing
+the interpreter lock of the server process.
+
+"""
+
+import os
+import threading
+import multiprocessing
+
+
+class WorkerPool(object):
+    '''Class that implements a pool of worker processes.
+
+    Each worker owns the test cases of the sessions pinned to it and serves
+    the calls of the server over a pipe, one call at a time.
+
+    '''
+
+    def __init__(self, processes=None, sessions_per_process=None, build_dir='./build'):
+        '''Constructor.
+
+        Parameters
+        ----------
+        processes : int, optional
+            Number of worker processes.
+            Default is None, the number of cpus.
+        sessions_per_process : int, optional
+            Maximum number of sessions per worker.
+            Default is None (unlimited).
+        build_dir : string, optional
+            Directory of the per worker model files.
+            Default is './build'.
+
+        '''
+
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        self.sessions_per_process = sessions_per_process
+        self.build_dir = build_dir
+        self.workers = []
+        for i in range(processes):
+            conn, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_work, args=(child,))
+            process.daemon = True
+            process.start()
+            child.close()
+            self.workers.append({'conn':conn,
+                                 'process':process,
+                                 'lock':threading.Lock(),
+                                 'sessions':set()})
+        self.lock = threading.Lock()
+
+    def create(self, session_id, con):
+        '''Creates the test case of a session on the least loaded worker.
+
+        Parameters
+        ----------
+        session_id : string
+            Identifier of the session.
+        con : dict
+            Defines the test case configuration.
+
+        Returns
+        -------
+        case : RemoteCase
+            Proxy of the test case.
+
+        '''
+
+        with self.lock:
+            index = min(range(len(self.workers)), key=lambda i: len(self.workers[i]['sessions']))
+            sessions = self.workers[index]['sessions']
+            if self.sessions_per_process is not None and len(sessions) >= self.sessions_per_process:
+                raise RuntimeError('All worker processes are full.')
+            sessions.add(session_id)
+        # Workers compile in their own directory
+        con = dict(con)
+        con['build_dir'] = os.path.join(self.build_dir, 'worker{}'.format(index))
+        try:
+            self.call(index, session_id, '__create__', con)
+        except Exception:
+            with self.lock:
+                sessions.discard(session_id)
+            raise
+
+        return RemoteCase(self, index, session_id)
+
+    def delete(self, index, session_id):
+        '''Deletes the test case of a session.'''
+
+        self.call(index, session_id, '__delete__')
+        with self.lock:
+            self.workers[index]['sessions'].discard(session_id)
+
+    def call(self, index, session_id, method, *args, **kwargs):
+        '''Calls a method of a test case owned by a worker.
+
+        Parameters
+        ----------
+        index : int
+            Index of the worker.
+        session_id : string
+            Identifier of the session.
+        method : string
+            Name of the method.
+        args, kwargs :
+            Arguments of the method.
+
+        Returns
+        -------
+        result :
+            Return value of the method. Exceptions are raised again.
+
+        '''
+
+        worker = self.workers[index]
+        with worker['lock']:
+            try:
+                worker['conn'].send((session_id, method, args, kwargs))
+                ok, result = worker['conn'].recv()
+            except (EOFError, IOError, OSError):
+                raise RuntimeError('Worker process {} exited.'.format(index))
+        if not ok:
+            raise result
+
+        return result
+
+    def status(self):
+        '''Returns the sessions and the state of each worker.'''
+
+        with self.lock:
+            return [{'pid':worker['process'].pid,
+                     'alive':worker['process'].is_alive(),
+                     'sessions':sorted(worker['sessions'])} for worker in self.workers]
+
+
+class RemoteCase(object):
+    '''Class that implements a proxy of a test case owned by a worker.
+
+    Methods are called in the worker, attributes are read from the worker.
+
+    '''
+
+    # Names of the test case attributes that are methods
+    methods = set()
+    # Methods returning metadata that does not change, answered from a
+    # local copy so that they do not wait for a running simulation
+    static = set(['get_inputs', 'get_measurements', 'get_faults', 'get_fault_info'])
+
+    def __init__(self, pool, index, session_id):
+        self.pool = pool
+        self.index = index
+        self.session_id = session_id
+        self.cache = {}
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if name not in RemoteCase.methods:
+            kind, value = self.pool.call(self.index, self.session_id, '__getattr__', name)
+            if kind == 'value':
+                return value
+            RemoteCase.methods.add(name)
+
+        def method(*args, **kwargs):
+            if name in RemoteCase.static and not kwargs:
+                key = (name,) + args
+                if key not in self.cache:
+                    self.cache[key] = self.pool.call(self.index, self.session_id, name, *args)
+                return self.cache[key]
+            if name == 'set_scenario':
+                # Input and output faults change the signals of the model
+                self.cache.clear()
+            return self.pool.call(self.index, self.session_id, name, *args, **kwargs)
+
+        return method
+
+
+def _work(conn):
+    '''Serves the calls of the server in a worker process.'''
+
+    from testcase import TestCase
+    cases = {}
+    while True:
+        try:
+            session_id, method, args, kwargs = conn.recv()
+        except (EOFError, IOError):
+            break
+        try:
+            if method == '__create__':
+                con = args[0]
+                if not os.path.isdir(con['build_dir']):
+                    os.makedirs(con['build_dir'])
+                cases[session_id] = TestCase(con)
+                result = None
+            elif method == '__delete__':
+                cases.pop(session_id, None)
+                result = None
+            elif method == '__getattr__':
+                value = getattr(cases[session_id], args[0])
+                result = ('method', None) if callable(value) else ('value', value)
+            else:
+                result = getattr(cases[session_id], method)(*args, **kwargs)
+        except Exception as e:
+            _send(conn, False, e)
+        else:
+            _send(conn, True, result)
+
+
+def _send(conn, ok, result):
+    '''Sends a result, or an error if the result cannot be pickled.'''
+
+    try:
+        conn.send((ok, result))
+    except Exception as e:
+        conn.send((False, RuntimeError('{}: {}'.format(type(e).__name__, e))))
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements the input schedules of the test case, time series of
+control inputs that are applied by the server at every step where the
+client does not set the input, e.g. to play back recorded setpoints.
+
+"""
+
+import csv
+import numpy as np
+
+# Interpolation between the samples of a schedule
+interpolations = ('previous', 'linear')
+
+
+class InputSchedule(object):
+    '''Class that evaluates a time series of control inputs.
+
+    A schedule is defined by a dictionary with the times of its samples,
+    either as ``time`` or as ``interval`` and ``start_time``, and the
+    ``values`` of each input, or by the ``csv`` text of a table with one
+    column per input (see ``read_csv``). Values are held until the next
+    sample (``previous``) or interpolated (``linear``), and the last value
+    holds after the end of the schedule. Inputs are not scheduled before
+    the first sample or where their value is null.
+
+    '''
+
+    def __init__(self, definition, names=None):
+        '''Constructor.
+
+        Parameters
+        ----------
+        definition : dict
+            {'time':[<time>] or 'interval':<seconds>, 'start_time':<time>,
+             'values':{<input_name>:[<value>]} or 'csv':<text>,
+             'columns':{<csv column>:<input_name>}, 'time_column':<csv column>,
+             'interpolation':'previous' or 'linear'}
+            ``start_time`` defaults to 0 and ``interpolation`` to ``previous``.
+        names : list, optional
+            Names of the control inputs of the test case.
+            Default is None, the input names are not checked.
+
+        '''
+
+        if not hasattr(definition, 'get'):
+            raise ValueError('A schedule is an object with its time and values.')
+        self.interpolation = definition.get('interpolation', 'previous')
+        if self.interpolation not in interpolations:
+            raise ValueError('Unknown interpolation {}, expected one of {}.'.format(
+                self.interpolation, ', '.join(interpolations)))
+        times = definition.get('time')
+        if 'csv' in definition:
+            values, csv_times = read_csv(definition['csv'], definition.get('columns'),
+                                         definition.get('time_column'))
+            if csv_times is not None:
+                times = csv_times
+        else:
+            values = definition.get('values')
+            if not hasattr(values, 'items') or not values:
+                raise ValueError('A schedule requires the values of at least one input.')
+        self.names = sorted(values.keys())
+        if names is not None:
+            for name in self.names:
+                if name not in names:
+                    raise ValueError('Unknown input {}.'.format(name))
+        self.values = np.column_stack([[np.nan if v is None else float(v) for v in values[name]]
+                                       for name in self.names])
+        n = len(self.values)
+        if times is None:
+            if definition.get('interval') is None:
+                raise ValueError('A schedule requires time or interval.')
+            interval = float(definition['interval'])
+            if interval <= 0:
+                raise ValueError('The interval of a schedule must be positive.')
+            times = float(definition.get('start_time', 0)) + interval*np.arange(n)
+        self.times = np.asarray(times, dtype=float)
+        if self.times.shape != (n,):
+            raise ValueError('The schedule has {} times and {} values.'.format(len(self.times), n))
+        if n == 0:
+            raise ValueError('The schedule is empty.')
+        if np.any(np.isnan(self.times)) or np.any(np.diff(self.times) <= 0):
+            raise ValueError('The times of a schedule must be increasing.')
+
+    def at(self, times):
+        '''Evaluates the schedule.
+
+        Parameters
+        ----------
+        times : float or numpy array
+            Simulation times in seconds.
+
+        Returns
+        -------
+        values : dict
+            Values of the inputs at the times, NaN where an input is not
+            scheduled.
+            {<input_name>:<value or array>}
+
+        '''
+
+        t = np.atleast_1d(np.asarray(times, dtype=float))
+        # Sample that applies at each time
+        rows = np.searchsorted(self.times, t, side='right') - 1
+        index = np.maximum(rows, 0)
+        values = self.values[index]
+        if self.interpolation == 'linear':
+            following = np.minimum(index + 1, len(self.times) - 1)
+            span = self.times[following] - self.times[index]
+            weight = np.where(span > 0, (t - self.times[index])/np.where(span > 0, span, 1.), 0.)
+            weight = np.clip(weight, 0., 1.)[:, None]
+            interpolated = values + weight*(self.values[following] - values)
+            # Interpolate towards samples that are set
+            values = np.where(np.isnan(interpolated), values, interpolated)
+        values = np.where((rows >= 0)[:, None], values, np.nan)
+        if np.ndim(times) == 0:
+            return dict((name, values[0, i]) for i, name in enumerate(self.names))
+
+        return dict((name, values[:, i]) for i, name in enumerate(self.names))
+
+    def change_times(self):
+        '''Returns the times at which a held value changes, none for linear
+        interpolation, which changes continuously.'''
+
+        if self.interpolation != 'previous':
+            return []
+        values = np.where(np.isnan(self.values), np.inf, self.values)
+        changed = np.concatenate(([True], np.any(values[1:] != values[:-1], axis=1)))
+
+        return [float(t) for t in self.times[changed]]
+
+    def definition(self):
+        '''Returns the definition of the schedule with its values as arrays.'''
+
+        return {'time':[float(t) for t in self.times],
+                'values':dict((name, [None if np.isnan(v) else float(v) for v in self.values[:, i]])
+                              for i, name in enumerate(self.names)),
+                'interpolation':self.interpolation}
+
+
+def read_csv(text, columns=None, time_column=None):
+    '''Reads the values of a schedule from a csv table with a header row.
+
+    Parameters
+    ----------
+    text : string
+        Text of the table, e.g. of examples/setpoints1.csv.
+    columns : dict, optional
+        Inputs of the columns, other columns are ignored.
+        {<column>:<input_name>}
+        Default is None, every column except the time column is an input.
+    time_column : string, optional
+        Column of the sample times.
+        Default is None, the table has no time column.
+
+    Returns
+    -------
+    values : dict
+        {<input_name>:[<value>]}, None for empty cells.
+    times : list
+        Times of the samples, None without time column.
+
+    '''
+
+    if not isinstance(text, type(u'')):
+        text = text.decode('utf-8')
+    lines = text.lstrip(u'\ufeff').splitlines()
+    if str is bytes:
+        lines = [line.encode('utf-8') for line in lines]
+    rows = [row for row in csv.reader(lines) if row]
+    if not rows:
+        raise ValueError('The csv table is empty.')
+    header = [name.strip() for name in rows[0]]
+    if columns is None:
+        columns = dict((name, name) for name in header if name != time_column)
+    for name in list(columns.keys()) + ([time_column] if time_column is not None else []):
+        if name not in header:
+            raise ValueError('Unknown column {}.'.format(name))
+    def column(name):
+        i = header.index(name)
+        try:
+            return [float(row[i]) if i < len(row) and row[i].strip() else None for row in rows[1:]]
+        except ValueError as e:
+            raise ValueError('Column {}: {}'.format(name, e))
+    values = dict((columns[name], column(name)) for name in columns)
+    if not values:
+        raise ValueError('The csv table has no input column.')
+
+    return values, (column(time_column) if time_column is not None else None)
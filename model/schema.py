@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements the request schemas of the simulation server, which
+validate and convert request bodies in one pass over the values sent.
+
+"""
+
+import ast
+import json
+
+
+class SchemaError(ValueError):
+    '''Error raised for a request body that does not match its schema.'''
+
+
+def _number(name, value):
+    '''Converts a value to a float, None if it is not set.'''
+
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise SchemaError('Value of {} is not a number: {!r}.'.format(name, value))
+
+
+class InputSchema(object):
+    '''Class that converts the control inputs of an advance request.
+
+    The inputs are given either as an object {<input_name>:<value>} (json
+    or form data), or as an array of values ordered like the inputs of the
+    test case, where null leaves an input unset. Other keys of an object,
+    e.g. ``time``, are ignored unless the schema is strict.
+
+    '''
+
+    def __init__(self, names, strict=False):
+        '''Constructor.
+
+        Parameters
+        ----------
+        names : list
+            Names of the control inputs, in the order of the array form.
+        strict : bool, optional
+            True to reject the keys that are not inputs.
+            Default is False.
+
+        '''
+
+        self.names = list(names)
+        self.index = set(self.names)
+        self.strict = strict
+
+    def parse(self, data):
+        '''Validates and converts control inputs.
+
+        Parameters
+        ----------
+        data : dict or list
+            Control inputs of the request.
+
+        Returns
+        -------
+        u : dict
+            Values of the inputs that are set.
+            {<input_name>:<value>}
+
+        '''
+
+        u = {}
+        if data is None:
+            return u
+        if isinstance(data, (list, tuple)):
+            if len(data) > len(self.names):
+                raise SchemaError('Expected at most {} input values, got {}.'.format(len(self.names), len(data)))
+            for name, value in zip(self.names, data):
+                value = _number(name, value)
+                if value is not None:
+                    u[name] = value
+            return u
+        if not hasattr(data, 'items'):
+            raise SchemaError('Expected an object or an array of input values.')
+        for name, value in data.items():
+            if name not in self.index:
+                if self.strict:
+                    raise SchemaError('Unknown input {}.'.format(name))
+                continue
+            value = _number(name, value)
+            if value is not None:
+                u[name] = value
+
+        return u
+
+
+class ScenarioSchema(object):
+    '''Class that converts the faults of a fault scenario request.
+
+    Faults of key points are given as {'value':<value>, 'fault_time':<time>}
+    and inputs and outputs as {'name':<name>}, either as objects or, for
+    form data, as their json or Python literal.
+
+    '''
+
+    def __init__(self, info):
+        '''Constructor.
+
+        Parameters
+        ----------
+        info : dict
+            Test case information, see senario.json.
+
+        '''
+
+        self.fields = {}
+        for key, entry in info.items():
+            kind = entry.get('type', '')
+            if 'input' in kind or 'output' in kind:
+                self.fields[key] = (('name', str),)
+            else:
+                self.fields[key] = (('value', float), ('fault_time', float))
+
+    def parse(self, data):
+        '''Validates and converts a fault scenario.
+
+        Parameters
+        ----------
+        data : dict
+            Faults of the request.
+
+        Returns
+        -------
+        scenario : dict
+            Descriptions of the faults that are set.
+            {<fault_name>:{<field>:<value>}}
+
+        '''
+
+        scenario = {}
+        if data is None:
+            return scenario
+        if not hasattr(data, 'items'):
+            raise SchemaError('Expected an object of faults.')
+        for key, fault in data.items():
+            fields = self.fields.get(key)
+            if fields is None:
+                raise SchemaError('Unknown fault {}.'.format(key))
+            if fault is None or fault == '':
+                continue
+            if not isinstance(fault, dict):
+                fault = _literal(key, fault)
+            parsed = {}
+            for field, convert in fields:
+                if field not in fault:
+                    raise SchemaError('Fault {} requires {}.'.format(key, ', '.join(f for f, c in fields)))
+                try:
+                    parsed[field] = convert(fault[field])
+                except (TypeError, ValueError):
+                    raise SchemaError('Invalid {} of fault {}: {!r}.'.format(field, key, fault[field]))
+            if len(fault) > len(fields):
+                unknown = sorted(set(fault) - set(f for f, c in fields))
+                raise SchemaError('Unknown fields of fault {}: {}.'.format(key, ', '.join(unknown)))
+            scenario[key] = parsed
+
+        return scenario
+
+
+def _literal(key, text):
+    '''Parses a fault description sent as text.'''
+
+    try:
+        fault = json.loads(text)
+    except (TypeError, ValueError):
+        try:
+            fault = ast.literal_eval(text)
+        except (SyntaxError, ValueError):
+            fault = None
+    if not isinstance(fault, dict):
+        raise SchemaError('Fault {} is not an object: {!r}.'.format(key, text))
+
+    return fault
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements the sessions of the simulation server, each of which
+owns a test case so that several simulations can be served by one process.
+
+"""
+
+import copy
+import uuid
+import threading
+from testcase import TestCase, construction
+
+# Configuration entries that can be set per session
+session_options = ['scenario', 'step', 'step_align', 'events', 'default_input', 'schedule', 'ncp', 'result_capacity', 'max_snapshots', 'subscription']
+
+
+class SessionManager(object):
+    '''Class that hosts the test cases of several sessions.
+
+    Test cases of sessions that share a model load the same compiled fmu,
+    either from the fmu cache or from the last compilation, as separate
+    instances.
+
+    '''
+
+    def __init__(self, con, max_sessions=None, pool=None):
+        '''Constructor.
+
+        Parameters
+        ----------
+        con : dict
+            Defines the test case configuration shared by the sessions.
+        max_sessions : int, optional
+            Maximum number of sessions.
+            Default is None (unlimited).
+        pool : WorkerPool, optional
+            Worker processes owning the test cases.
+            Default is None, test cases are owned by this process.
+
+        '''
+
+        self.con = con
+        self.max_sessions = max_sessions
+        self.pool = pool
+        self.cases = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+        # Test cases write the model to the same files while constructed,
+        # also when a new fault scenario is compiled
+        self.construction = construction
+
+    def create(self, options=None, session_id=None):
+        '''Creates a session.
+
+        Parameters
+        ----------
+        options : dict, optional
+            Configuration entries of the session, see ``session_options``.
+            Default is None, the shared configuration is used.
+        session_id : string, optional
+            Identifier of the session.
+            Default is None, a random identifier is generated.
+
+        Returns
+        -------
+        session_id : string
+            Identifier of the session.
+
+        '''
+
+        options = options or {}
+        for key in options:
+            if key not in session_options:
+                raise ValueError('Option {} cannot be set per session.'.format(key))
+        with self.lock:
+            if self.max_sessions is not None and len(self.cases) >= self.max_sessions:
+                raise RuntimeError('Maximum number of sessions reached.')
+            if session_id is None:
+                session_id = uuid.uuid4().hex
+            elif session_id in self.cases:
+                raise ValueError('Session {} already exists.'.format(session_id))
+            # Reserve the identifier while the test case is constructed
+            self.cases[session_id] = None
+            self.locks[session_id] = threading.RLock()
+        con = copy.deepcopy(self.con)
+        con.update(copy.deepcopy(options))
+        try:
+            if self.pool is not None:
+                case = self.pool.create(session_id, con)
+            else:
+                with self.construction:
+                    case = TestCase(con)
+        except Exception:
+            with self.lock:
+                del self.cases[session_id]
+                del self.locks[session_id]
+            raise
+        with self.lock:
+            self.cases[session_id] = case
+
+        return session_id
+
+    def get(self, session_id):
+        '''Returns the test case of a session, None if the session does not
+        exist or is not constructed yet.'''
+
+        with self.lock:
+            return self.cases.get(session_id)
+
+    def get_lock(self, session_id):
+        '''Returns the lock that serializes the requests of a session.'''
+
+        with self.lock:
+            return self.locks.get(session_id)
+
+    def delete(self, session_id):
+        '''Deletes a session.
+
+        Returns
+        -------
+        deleted : boolean
+            False if the session does not exist.
+
+        '''
+
+        with self.lock:
+            if session_id not in self.cases:
+                return False
+            lock = self.locks[session_id]
+        # Wait for running requests of the session
+        with lock:
+            with self.lock:
+                case = self.cases.pop(session_id, None)
+                self.locks.pop(session_id, None)
+            if self.pool is not None and case is not None:
+                self.pool.delete(case.index, session_id)
+
+        return True
+
+    def list(self):
+        '''Returns the identifiers of the sessions.'''
+
+        with self.lock:
+            return sorted(self.cases.keys())
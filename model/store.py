@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements the columnar storage of the simulation results.
+
+"""
+
+import numpy as np
+
+
+class ColumnStore(object):
+    '''Class that stores the trajectories of a group of signals.
+
+    Samples are kept in a preallocated 2-D float64 array with one column per
+    signal, plus a time vector, which grow by chunks as samples are appended.
+    If a capacity is given, the store is a ring buffer that only keeps the
+    most recent samples.
+
+    '''
+
+    def __init__(self, names, chunk=4096, capacity=None):
+        '''Constructor.
+
+        Parameters
+        ----------
+        names : list
+            Names of the signals.
+        chunk : int, optional
+            Minimum number of samples allocated at once.
+            Default is 4096.
+        capacity : int, optional
+            Maximum number of samples kept.
+            Default is None (unbounded).
+
+        '''
+
+        self.names = list(names)
+        self.index = dict((name, i) for i, name in enumerate(self.names))
+        self.chunk = int(chunk)
+        self.capacity = None if capacity is None else int(capacity)
+        rows = self.chunk if self.capacity is None else self.capacity
+        self.time = np.empty(rows)
+        self.data = np.empty((rows, len(self.names)))
+        # Position of the oldest sample, only moves in ring mode
+        self.head = 0
+        # Number of samples kept
+        self.size = 0
+        # Number of samples appended since the construction
+        self.count = 0
+
+    def __len__(self):
+
+        return self.size
+
+    def append(self, time, values, names=None):
+        '''Appends samples.
+
+        Parameters
+        ----------
+        time : numpy array
+            Times of the samples, shape (k,).
+        values : numpy array
+            Values of the samples, shape (k, len(names)), columns ordered
+            as ``names``.
+        names : list, optional
+            Names of the signals of the columns of values, the other
+            signals are stored as NaN.
+            Default is None, all signals in the order of the store.
+
+        '''
+
+        time = np.asarray(time, dtype=float)
+        if names is not None:
+            full = np.full((len(time), len(self.names)), np.nan)
+            full[:,[self.index[name] for name in names]] = np.asarray(values, dtype=float).reshape(len(time), len(names))
+            values = full
+        values = np.asarray(values, dtype=float).reshape(len(time), len(self.names))
+        k = len(time)
+        self.count += k
+        if self.capacity is None:
+            if self.size + k > len(self.time):
+                self.__grow(self.size + k)
+            self.time[self.size:self.size+k] = time
+            self.data[self.size:self.size+k] = values
+            self.size += k
+            return
+        # Ring mode, older samples are overwritten
+        if k > self.capacity:
+            time = time[-self.capacity:]
+            values = values[-self.capacity:]
+            k = self.capacity
+        index = (self.head + self.size + np.arange(k)) % self.capacity
+        self.time[index] = time
+        self.data[index] = values
+        self.size += k
+        if self.size > self.capacity:
+            self.head = (self.head + self.size - self.capacity) % self.capacity
+            self.size = self.capacity
+
+    def __grow(self, rows):
+        '''Reallocates the arrays for at least the given number of samples.'''
+
+        rows = max(rows, 2*len(self.time), self.chunk)
+        time = np.empty(rows)
+        data = np.empty((rows, len(self.names)))
+        time[:self.size] = self.time[:self.size]
+        data[:self.size] = self.data[:self.size]
+        self.time = time
+        self.data = data
+
+    def arrays(self):
+        '''Returns the samples in chronological order.
+
+        Returns
+        -------
+        time : numpy array
+            Times of the samples, shape (size,).
+        data : numpy array
+            Values of the samples, shape (size, len(names)).
+            Views of the store unless the ring buffer wraps around.
+
+        '''
+
+        end = self.head + self.size
+        if self.capacity is None or end <= self.capacity:
+            return self.time[self.head:end], self.data[self.head:end]
+        index = np.arange(self.head, end) % self.capacity
+
+        return self.time[index], self.data[index]
+
+    def first(self):
+        '''Returns the number of samples dropped by the ring buffer, i.e.
+        the cursor of the oldest sample kept.'''
+
+        return self.count - self.size
+
+    def __search(self, time, side):
+        '''Returns the position of a time among the kept samples.'''
+
+        end = self.head + self.size
+        if self.capacity is None or end <= self.capacity:
+            return int(np.searchsorted(self.time[self.head:end], time, side))
+        older = self.time[self.head:]
+        position = int(np.searchsorted(older, time, side))
+        if position < len(older):
+            return position
+
+        return len(older) + int(np.searchsorted(self.time[:end-self.capacity], time, side))
+
+    def __take(self, lo, hi, columns):
+        '''Returns the samples at positions lo to hi of the given columns.'''
+
+        lo = self.head + lo
+        hi = self.head + hi
+        if self.capacity is None or hi <= self.capacity:
+            return self.time[lo:hi], self.data[lo:hi][:,columns]
+        index = np.arange(lo, hi) % self.capacity
+
+        return self.time[index], self.data[np.ix_(index, columns)]
+
+    def query(self, start=None, end=None, names=None, cursor=None,
+              decimate=None, resample=None):
+        '''Returns the samples of a time window.
+
+        Only the samples of the window are read, so that the cost does not
+        grow with the number of samples kept.
+
+        Parameters
+        ----------
+        start : float, optional
+            Start of the window in seconds, inclusive.
+        end : float, optional
+            End of the window in seconds, inclusive.
+        names : list, optional
+            Names of the signals. Default is None, all signals.
+        cursor : int, optional
+            Only return the samples appended after the sample with this
+            cursor, e.g. the cursor returned by the previous query.
+        decimate : int, optional
+            Only return every ``decimate``-th sample.
+        resample : float, optional
+            Interpolate the samples on a grid with this interval in seconds.
+
+        Returns
+        -------
+        time : numpy array
+            Times of the samples.
+        data : numpy array
+            Values of the samples, one column per name.
+        cursor : int
+            Cursor following the last sample of the window.
+
+        '''
+
+        if names is None:
+            names = self.names
+        columns = [self.index[name] for name in names]
+        lo = 0
+        hi = self.size
+        if cursor is not None:
+            lo = min(max(int(cursor) - self.first(), 0), self.size)
+        if start is not None:
+            lo = max(lo, self.__search(start, 'left'))
+        if end is not None:
+            hi = min(hi, self.__search(end, 'right'))
+        hi = max(lo, hi)
+        next_cursor = self.first() + hi
+        time, data = self.__take(lo, hi, columns)
+        if resample is not None and len(time) > 0:
+            grid = np.arange(time[0], time[-1] + 0.5*resample, resample)
+            grid = grid[grid <= time[-1]]
+            data = np.column_stack([np.interp(grid, time, data[:,i]) for i in range(len(columns))]
+                                   ) if columns else np.empty((len(grid), 0))
+            time = grid
+        if decimate is not None:
+            time = time[::int(decimate)]
+            data = data[::int(decimate)]
+
+        return time, data, next_cursor
+
+    def to_dict(self):
+        '''Returns the trajectories as lists.
+
+        Returns
+        -------
+        trajectories : dict
+            {'time':<time_trajectory>, <name>:<trajectory>}
+
+        '''
+
+        time, data = self.arrays()
+        trajectories = {'time': time.tolist()}
+        for name, i in self.index.items():
+            trajectories[name] = data[:,i].tolist()
+
+        return trajectories
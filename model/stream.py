@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements a streaming channel for closed-loop control, where a
+client advances a session over one persistent TCP connection with compact
+binary frames instead of one HTTP request per step.
+
+Every frame is prefixed by its length as a 4-byte unsigned integer in
+network byte order. The client opens the channel with a JSON frame
+``{"session_id":<id>}`` (an empty frame selects the default session) and
+receives a JSON frame ``{"inputs":[<name>], "measurements":[<name>],
+"step":<step>}``, whose list positions are the integer ids of the signals.
+Each following frame of the client advances the simulation one step and is
+a sequence of (uint16 input id, float64 value) pairs, empty for the default
+inputs. The server answers each step with a status byte, 0 followed by the
+float64 time and measurement values in id order (NaN if not subscribed),
+or 1 followed by an error message.
+
+"""
+
+import json
+import struct
+import socket
+import threading
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+_length = struct.Struct('!I')
+_pair = struct.Struct('!Hd')
+# Value of the measurements that are not subscribed
+nan = float('nan')
+
+
+def read_frame(sock):
+    '''Returns the payload of the next frame, None if the connection is closed.'''
+
+    header = _read(sock, _length.size)
+    if header is None:
+        return None
+
+    return _read(sock, _length.unpack(header)[0])
+
+
+def write_frame(sock, payload):
+    '''Writes a frame.'''
+
+    sock.sendall(_length.pack(len(payload)) + payload)
+
+
+def _read(sock, n):
+    '''Reads exactly n bytes, None if the connection is closed.'''
+
+    data = b''
+    while len(data) < n:
+        part = sock.recv(n - len(data))
+        if not part:
+            return None
+        data += part
+
+    return data
+
+
+class StreamServer(object):
+    '''Class that serves the streaming channel of the sessions.'''
+
+    def __init__(self, sessions, host='0.0.0.0', port=5001, runs=None):
+        '''Constructor.
+
+        Parameters
+        ----------
+        sessions : SessionManager
+            Sessions advanced through the channel.
+        host : string, optional
+            Address the server listens on.
+            Default is '0.0.0.0'.
+        port : int, optional
+            Port the server listens on.
+            Default is 5001.
+        runs : dict, optional
+            Paced runs of the sessions, which are not advanced through the
+            channel while they run.
+            {<session_id>:<PacedRun>}
+
+        '''
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.sessions = sessions
+        self.server.runs = {} if runs is None else runs
+
+    def start(self):
+        '''Serves the channel in a background thread.'''
+
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        '''Stops the server.'''
+
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    '''Serves one connection.'''
+
+    def handle(self):
+        sessions = self.server.sessions
+        runs = self.server.runs
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        hello = read_frame(sock)
+        if hello is None:
+            return
+        session_id = (json.loads(hello.decode('utf-8')) if hello else {}).get('session_id', 'default')
+        case = sessions.get(session_id)
+        lock = sessions.get_lock(session_id)
+        if case is None or lock is None:
+            write_frame(sock, json.dumps({'error':'Unknown session {}.'.format(session_id)}).encode('utf-8'))
+            return
+        inputs = list(case.get_inputs())
+        measurements = list(case.get_measurements())
+        write_frame(sock, json.dumps({'inputs':inputs,
+                                      'measurements':measurements,
+                                      'step':case.get_step()}).encode('utf-8'))
+        # Structs of the frames, compiled once per connection
+        result = struct.Struct('!Bd{}d'.format(len(measurements)))
+        parsers = {}
+        while True:
+            payload = read_frame(sock)
+            if payload is None:
+                return
+            try:
+                n = len(payload) // _pair.size
+                if n * _pair.size != len(payload):
+                    raise ValueError('Input frame of {} bytes is not a sequence of (id, value) pairs.'.format(len(payload)))
+                if n not in parsers:
+                    parsers[n] = struct.Struct('!' + 'Hd' * n)
+                values = parsers[n].unpack(payload)
+                u = {}
+                for i in range(0, len(values), 2):
+                    if values[i] >= len(inputs):
+                        raise ValueError('Unknown input id {}.'.format(values[i]))
+                    u[inputs[values[i]]] = values[i+1]
+                with lock:
+                    if sessions.get(session_id) is not case:
+                        raise RuntimeError('Session {} was deleted.'.format(session_id))
+                    run = runs.get(session_id)
+                    if run is not None and run.status()['state'] == 'running':
+                        raise RuntimeError('Session {} is in a paced run.'.format(session_id))
+                    y = case.advance(u)
+                if y is None:
+                    raise RuntimeError('Simulation failed.')
+                frame = result.pack(0, y['time'], *[y.get(name, nan) for name in measurements])
+            except Exception as e:
+                frame = struct.pack('!B', 1) + str(e).encode('utf-8')
+            write_frame(sock, frame)
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+This module implements a headless sweep over fault scenarios, which runs
+every combination of faults, magnitudes and fault times of a sweep
+definition across a pool of processes and writes one npz file per run plus
+an index, e.g. to generate training data for fault detection.
+
+Usage: python sweep.py <sweep_definition> [<config>]
+
+"""
+
+import os
+import sys
+import json
+import time
+import itertools
+import multiprocessing
+from export import export
+
+# Test case of the worker process, reused between runs in compile-once mode
+_worker = {}
+
+
+def load_definition(path):
+    '''Reads a sweep definition.
+
+    Parameters
+    ----------
+    path : string
+        Path of the json sweep definition:
+        {"faults":[<fault_name>] or <fault_type>,
+         "values":[<value>] or {<fault_type or fault_name>:[<value>]},
+         "fault_times":[<time>],
+         "start_time":<time>, "warmup_period":<seconds>, "end_time":<time>,
+         "step":<seconds>,
+         "schedule":{"time":[<time>], <input_name>:[<value>]} (see
+                     ``TestCase.advance_batch``),
+         "baseline":<true to add a run without fault>,
+         "processes":<number>,
+         "output":<directory>}
+        ``faults`` defaults to all key point faults of ``model_info``,
+        ``schedule`` to the default inputs.
+
+    Returns
+    -------
+    definition : dict
+        The sweep definition.
+
+    '''
+
+    with open(path) as f:
+        definition = json.load(f)
+    for key in ('values', 'fault_times', 'start_time', 'end_time'):
+        if key not in definition:
+            raise ValueError('The sweep definition requires {}.'.format(key))
+
+    return definition
+
+
+def runs(definition, info):
+    '''Lists the runs of a sweep.
+
+    Parameters
+    ----------
+    definition : dict
+        Sweep definition, see ``load_definition``.
+    info : dict
+        Test case information, see senario.json.
+
+    Returns
+    -------
+    runs : list
+        [{'run':<run_id>, 'fault':<fault_name>, 'value':<value>,
+          'fault_time':<time>}], the fault of the baseline run is None.
+
+    '''
+
+    faults = definition.get('faults')
+    if faults is None:
+        faults = sorted(key for key in info if info[key]['type'] not in ('input', 'output'))
+    elif not isinstance(faults, list):
+        faults = sorted(key for key in info if info[key]['type'] == faults)
+    for fault in faults:
+        if fault not in info or info[fault]['type'] in ('input', 'output'):
+            raise ValueError('Unknown fault {}.'.format(fault))
+    values = definition['values']
+    combinations = []
+    if definition.get('baseline', True):
+        combinations.append((None, None, None))
+    for fault in faults:
+        if isinstance(values, dict):
+            grid = values.get(fault, values.get(info[fault]['type'], []))
+        else:
+            grid = values
+        for value, fault_time in itertools.product(grid, definition['fault_times']):
+            combinations.append((fault, value, fault_time))
+    width = len(str(len(combinations)))
+
+    return [{'run':'run{}'.format(str(i).zfill(width)),
+             'fault':fault,
+             'value':value,
+             'fault_time':fault_time} for i, (fault, value, fault_time) in enumerate(combinations)]
+
+
+def scenario(run, info):
+    '''Returns the fault scenario of a run.
+
+    The inputs and outputs of the test case are kept, like in the default
+    scenario of ``TestCase``.
+
+    '''
+
+    scenario = {}
+    for key in info:
+        if info[key]['type'] in ('input', 'output'):
+            scenario[key] = {'name':key}
+    if run['fault'] is not None:
+        scenario[run['fault']] = {'value':run['value'], 'fault_time':run['fault_time']}
+
+    return scenario
+
+
+def _simulate(args):
+    '''Simulates a run in a worker process and writes its results.'''
+
+    con, definition, run = args
+    started = time.time()
+    output = definition.get('output', './sweep')
+    path = os.path.join(output, run['run'] + '.npz')
+    entry = dict(run, file=os.path.basename(path))
+    try:
+        from testcase import TestCase
+        with open(con['model_info']) as f:
+            info = json.load(f)
+        case = _worker.get('case')
+        if case is not None and con.get('compile_once', False):
+            case.set_scenario(scenario(run, info))
+        else:
+            con = dict(con)
+            con['scenario'] = scenario(run, info)
+            con['build_dir'] = os.path.join(output, 'build', 'worker{}'.format(os.getpid()))
+            if not os.path.isdir(con['build_dir']):
+                os.makedirs(con['build_dir'])
+            case = _worker['case'] = TestCase(con)
+        case.set_step(definition.get('step', con['step']))
+        start_time = definition['start_time']
+        case.initialize(start_time, definition.get('warmup_period', 0))
+        n_steps = int(round((definition['end_time'] - start_time) / float(case.get_step())))
+        case.advance_batch(n_steps, definition.get('schedule'))
+        table = case.get_result_arrays()
+        with open(path + '.tmp', 'wb') as f:
+            for data in export('npz', table['time'], table['columns'], table['metadata']):
+                f.write(data)
+        os.rename(path + '.tmp', path)
+        entry['status'] = 'done'
+    except Exception as e:
+        entry['status'] = 'failed'
+        entry['error'] = '{}: {}'.format(type(e).__name__, e)
+    entry['seconds'] = time.time() - started
+
+    return entry
+
+
+def sweep(con, definition):
+    '''Runs a sweep.
+
+    Runs whose result file exists are skipped, so that an interrupted
+    sweep can be resumed.
+
+    Parameters
+    ----------
+    con : dict
+        Defines the test case configuration.
+    definition : dict
+        Sweep definition, see ``load_definition``.
+
+    Returns
+    -------
+    index : list
+        Runs with their ``status`` (``done``, ``failed`` or ``skipped``),
+        ``file`` and ``seconds``, also written to ``index.json`` in the
+        output directory.
+
+    '''
+
+    with open(con['model_info']) as f:
+        info = json.load(f)
+    output = definition.get('output', './sweep')
+    if not os.path.isdir(output):
+        os.makedirs(output)
+    index = []
+    pending = []
+    for run in runs(definition, info):
+        if os.path.exists(os.path.join(output, run['run'] + '.npz')):
+            index.append(dict(run, file=run['run'] + '.npz', status='skipped'))
+        else:
+            pending.append((con, definition, run))
+    if pending:
+        pool = multiprocessing.Pool(definition.get('processes'))
+        try:
+            for entry in pool.imap_unordered(_simulate, pending):
+                index.append(entry)
+                print('{} {} {} {} {}'.format(entry['run'], entry['fault'], entry['value'],
+                                              entry['fault_time'], entry['status']))
+                _write_index(output, definition, index)
+        finally:
+            pool.close()
+            pool.join()
+    _write_index(output, definition, index)
+
+    return sorted(index, key=lambda entry: entry['run'])
+
+
+def _write_index(output, definition, index):
+    '''Writes the index of a sweep.'''
+
+    path = os.path.join(output, 'index.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'definition':definition,
+                   'runs':sorted(index, key=lambda entry: entry['run'])}, f, indent=1)
+    os.rename(path + '.tmp', path)
+
+
+if __name__ == "__main__":
+    definition = load_definition(sys.argv[1])
+    config = sys.argv[2] if len(sys.argv) > 2 else 'config'
+    with open(config) as json_file:
+        con = json.load(json_file)
+    index = sweep(con, definition)
+    failed = [entry for entry in index if entry['status'] == 'failed']
+    print('{} runs, {} failed'.format(len(index), len(failed)))
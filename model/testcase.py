@@ -11,65 +11,186 @@ import numpy as np
 import copy
 import json
 import time
+import os
+import re
 from jinja2 import Template
 import jinja2
 from pymodelica import compile_fmu
 import ast
+import uuid
+import pickle
+import bisect
+import threading
+import collections
 import numpy as np
+from cache import FileCache, cache_key, library_version
+from store import ColumnStore
+from export import signal_metadata
+from metrics import Metrics, solver_statistics
+from schedule import InputSchedule
 
 
 
 
 templateLoader = jinja2.FileSystemLoader(searchpath='.')
 
-templateEnv = jinja2.Environment(loader=templateLoader)
+# Options passed to ``compile_fmu`` that determine the generated FMU.
+# ``jvm_args`` only affects the compiler process and is kept out of the
+# cache key. The target is set by ``target`` in the test case configuration.
+compile_options = {'compiler_log_level':'error',
+                   'target':'me',
+                   'version':'2.0'}
 
+def _compile_options(con):
+    '''Returns the compiler options of a test case configuration.'''
+    options = dict(compile_options)
+    options['target'] = con.get('target', 'me')
+    return options
 
-def _process_input(u, start_time):
-    '''Convert the input dictionary into a structured array.
+# Library fingerprints, computed once per process
+_library_versions = {}
+
+# Model hash of the fmu last compiled to each path by this process
+_compiled = {}
+
+# Held while a test case writes and compiles its model, test cases of one 
+# process share the model files unless they have their own ``build_dir``
+construction = threading.RLock()
+
+
+class InputMapper(object):
+    '''Class that converts control input data into pyfmi input objects.
+    
+    The index of the input names is built once, and the values of a step 
+    are written into one preallocated row.
+    
+    '''
+    
+    def __init__(self, input_names):
+        '''Constructor.
+        
+        Parameters
+        ----------
+        input_names : list
+            Names of the control inputs of the fmu.
+            
+        '''
+        
+        self.names = list(input_names)
+        self.index = dict((name, i+1) for i, name in enumerate(self.names))
+        # Time followed by the inputs in the order of names
+        self.row = np.empty((1, len(self.names)+1))
+        self.written = np.zeros(len(self.names)+1, dtype=bool)
+        
+    def __call__(self, u, start_time):
+        '''Convert the input dictionary into a structured array.
+        
+        Parameters
+        ----------
+        u : dict
+            Defines the control input data to be used for the step.
+            Inputs that are missing, None, NaN or empty are not written,
+            zero is a valid value.
+            {<input_name> : <input_value>}
+            
+        start_time: int
+            Start time of simulation in seconds.
+            
+        Returns
+        -------
+        input_object : structured array
+            Input for next time step, None if no input is written.
+            
+        '''
+        
+        self.written[:] = False
+        for key, value in u.items():
+            i = self.index.get(key)
+            if i is None or value is None or value == '':
+                continue
+            value = float(value)
+            if value != value:
+                continue
+            self.row[0,i] = value
+            self.written[i] = True
+        if not self.written.any():
+            return None
+        self.row[0,0] = start_time
+        self.written[0] = True
+        columns = np.flatnonzero(self.written)
+        u_list = [self.names[i-1] for i in columns[1:]]
+        return (u_list, self.row[:,columns])
+
+def _glob_escape(name):
+    '''Escapes the brackets of a variable name for the pyfmi result filter,
+    which uses glob patterns.'''
+    return re.sub(r'([\[\]])', r'[\1]', name)
+
+def _process_trajectory(trajectory, start_times, final_times, initial, scheduled=None):
+    '''Convert a time-indexed input trajectory into a piecewise constant
+    input object covering several steps.
         
     Parameters
     ----------
-    u : dict
-        Defines the control input data to be used for the step.
+    trajectory : dict
+        Defines the control input data indexed by time. A value applies 
+        from its time until the next time, None or NaN leave the input 
+        unchanged.
+        {'time':[<time>], <input_name>:[<input_value>]}
+        
+    start_times: numpy array
+        Start time of each step in seconds.
+        
+    final_times: numpy array
+        Final time of each step in seconds.
+        
+    initial: dict
+        Values of the inputs before the first step.
         {<input_name> : <input_value>}
         
-    start_time: int
-        Start time of simulation in seconds.
+    scheduled: dict, optional
+        Scheduled values of the inputs at the start of each step, used 
+        where the trajectory does not write an input, see ``InputSchedule``.
+        {<input_name> : <numpy array>}
             
-        
     Returns
     -------
     input_object : structured array
-        Input for next time step
+        Input for the steps, None if no input is written.
             
     '''    
-        
-    if u.keys():
-        # If there are overwriting keys available
-        # Check that any are overwritten
-        written = False
-        for key in u.keys():
-            if u[key]:
-                written = True
-                break
-        # If there are, create input object
-        if written:
-            u_list = []
-            u_trajectory = start_time
-            for key in u.keys():
-                if key != 'time' and u[key]:
-                    value = float(u[key])
-                    u_list.append(key)
-                    u_trajectory = np.vstack((u_trajectory, value))
-            input_object = (u_list, np.transpose(u_trajectory))
-        # Otherwise, input object is None
+    
+    times = np.asarray(trajectory['time'], dtype=float)
+    # Row of the trajectory that applies at the start of each step
+    rows = np.searchsorted(times, start_times, side='right') - 1
+    u_list = []
+    columns = []
+    steps = np.arange(len(start_times))
+    scheduled = scheduled or {}
+    for key in sorted(set(trajectory.keys()) | set(scheduled.keys())):
+        if key == 'time':
+            continue
+        if key in trajectory:
+            values = np.array([np.nan if v is None else float(v) for v in trajectory[key]])
+            values = np.where(rows >= 0, values[np.maximum(rows, 0)], np.nan)
         else:
-            input_object = None    
-        # Otherwise, input object is None
-    else:
-        input_object = None  
-    return input_object   
+            values = np.full(len(start_times), np.nan)
+        if key in scheduled:
+            values = np.where(np.isnan(values), scheduled[key], values)
+        written = ~np.isnan(values)
+        if not written.any():
+            continue
+        # Hold the last written value, or the initial value before
+        last = np.maximum.accumulate(np.where(written, steps, -1))
+        values = np.where(last >= 0, values[np.maximum(last, 0)], float(initial[key]))
+        u_list.append(key)
+        columns.append(values)
+    if not u_list:
+        return None
+    # Repeat each value at both ends of its step to get step changes
+    u_time = np.column_stack((start_times, final_times)).ravel()
+    u_trajectory = np.repeat(np.column_stack(columns), 2, axis=0)
+    return (u_list, np.column_stack((u_time, u_trajectory)))
 
 def path2modifer(keys,info,config):
     '''Generating a Modelica model modifier
@@ -148,6 +269,229 @@ def path2IO(keys,info,config):
           if temp != '':              
                IO = IO + temp +'\n'        
     return IO    
+
+def path2tunable(info,config):
+    '''Generating a Modelica model modifier that binds every fault block
+    to top-level parameters, so that faults can be set without recompiling.
+        
+    Parameters
+    ----------
+    info: dict
+        Defines the module configuration.
+        
+    config: dict
+        Defines the modifier and parameter template strings.
+                    
+    Returns
+    -------
+    modifier : string
+        Modifier redeclaring all fault blocks.
+    declarations : string
+        Declarations of the fault parameters.
+            
+    '''   
+    modifier = ''
+    declarations = ''
+    for key in sorted(info.keys()):
+        fault_type = info[key]['type']
+        if 'tunable' not in config[fault_type]:
+            continue
+        args = info[key]['path'].split('.')
+        temp = config[fault_type]['tunable'].format(args[-1],key)
+        for i in range(len(args)-2,-1,-1):   
+            temp =  args[i]+'('+temp+')'
+        modifier = modifier + temp +',\n' 
+        declarations = declarations + config[fault_type]['parameter'].format(key) +'\n'
+    return modifier[:-2], declarations
+
+def scenario2parameters(keys,info,config):
+    '''Generating the fault parameter values of a fault scenario.
+        
+    Parameters
+    ----------
+    keys : dict
+        Defines the module parameters.
+        
+    info: dict
+        Defines the module configuration.
+        
+    config: dict
+        Defines the modifier template string.
+                    
+    Returns
+    -------
+    parameters : dict
+        Values of all fault parameters, faults not in the scenario are 
+        disabled.
+        {<parameter_name> : <parameter_value>}
+            
+    '''   
+    parameters = {}
+    for key in info.keys():
+        if 'tunable' in config[info[key]['type']]:
+            parameters[key+'_value'] = 0.
+            parameters[key+'_fault_time'] = 0.
+    for key in keys.keys():
+       if keys[key] is not None and key+'_value' in parameters:
+          if not isinstance(keys[key],dict):
+               keys[key] = ast.literal_eval(keys[key])
+          parameters[key+'_value'] = float(keys[key]['value'])
+          parameters[key+'_fault_time'] = float(keys[key]['fault_time'])
+    return parameters
+
+def generate_model(con,info,config,scenario=None):
+    '''Renders the Modelica model of a test case.
+        
+    Parameters
+    ----------
+    con : dict
+        Defines the test case configuration.
+        
+    info: dict
+        Defines the module configuration.
+        
+    config: dict
+        Defines the modifier template string.
+        
+    scenario : dict, optional
+        Dict that describes the fault condition.
+        Default is None, all inputs and outputs are exposed.
+                    
+    Returns
+    -------
+    model : string
+        Modelica model of the test case.
+            
+    '''   
+    ios = {} 
+    for key in info:
+        if info[key]['type'] == 'output' or info[key]['type'] == 'input':
+            ios[key]={'name': key}
+    if scenario is None:
+        scenario = ios
+    if con.get('compile_once', False):
+        modifer, parameters = path2tunable(info,config)
+        IO_modifer = path2modifer(ios,info,config)
+        if IO_modifer != '':
+            modifer = modifer + ',\n' + IO_modifer
+    else:
+        modifer = path2modifer(scenario,info,config)        
+    IO = path2IO(ios,info,config)                    
+    if con.get('compile_once', False):
+        IO = IO + parameters
+    # The modifiers are rendered from memory, so that several models can
+    # be generated concurrently
+    loader = jinja2.ChoiceLoader([jinja2.DictLoader({'inner1':modifer,'inner2':IO}),
+                                  templateLoader])
+    template = jinja2.Environment(loader=loader).get_template(con['model_template'])
+    return template.render(inner1='inner1',inner2='inner2')
+
+def _fmu_cache(con):
+    '''Returns the fmu cache of a test case configuration, None if the
+    cache is not configured.'''
+    fmu_cache = con.get('fmu_cache', {})
+    if 'path' not in fmu_cache:
+        return None
+    max_size = fmu_cache.get('max_size_mb')
+    return FileCache(fmu_cache['path'],
+                     suffix='.fmu',
+                     max_size=None if max_size is None else max_size*1024*1024,
+                     max_entries=fmu_cache.get('max_entries'))
+
+def _warmup_cache(con):
+    '''Returns the warmup state cache of a test case configuration, None 
+    if the cache is not configured.'''
+    warmup_cache = con.get('warmup_cache', {})
+    if 'path' not in warmup_cache:
+        return None
+    max_size = warmup_cache.get('max_size_mb')
+    return FileCache(warmup_cache['path'],
+                     suffix='.state',
+                     max_size=None if max_size is None else max_size*1024*1024,
+                     max_entries=warmup_cache.get('max_entries'))
+
+def model_hash(con,model):
+    '''Computes the key of a model in the fmu cache.
+        
+    Parameters
+    ----------
+    con : dict
+        Defines the test case configuration.
+        
+    model : string
+        Modelica model of the test case.
+                    
+    Returns
+    -------
+    key : string
+        Hash of the model, the model class, the compiler options and, if a
+        cache outlives the process, the library version.
+            
+    '''   
+    version = con.get('fmu_cache', {}).get('library_version')
+    # The libraries are only walked for the caches, they do not change
+    # within the process
+    if version is None and ('path' in con.get('fmu_cache', {}) or 'path' in con.get('warmup_cache', {})):
+        if 'default' not in _library_versions:
+            _library_versions['default'] = library_version()
+        version = _library_versions['default']
+    return cache_key(model, con['model_class'], _compile_options(con), version)
+
+def cached_fmu(con,model):
+    '''Returns the path to the cached fmu of a model, None if the model
+    has not been compiled yet.'''
+    cache = _fmu_cache(con)
+    if cache is None:
+        return None
+    return cache.get(model_hash(con,model))
+
+def compile_model(con,model,mopath,compile_to='.'):
+    '''Compiles the model into an fmu, or reuses a cached one.
+        
+    When ``fmu_cache`` is configured, the fmu is looked up by 
+    ``model_hash`` and is only compiled on a cache miss.
+        
+    Parameters
+    ----------
+    con : dict
+        Defines the test case configuration.
+        
+    model : string
+        Modelica model of the test case.
+        
+    mopath : string
+        Path of the file the model is written to.
+        
+    compile_to : string, optional
+        Directory the fmu is compiled to. 
+        Default is the working directory.
+                    
+    Returns
+    -------
+    fmupath : string
+        Path to the fmu.
+            
+    '''   
+    cache = _fmu_cache(con)
+    key = model_hash(con,model)
+    fmupath = os.path.join(compile_to,'{}.fmu'.format(con['model_class']))
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    elif _compiled.get(fmupath) == key and os.path.exists(fmupath):
+        # Without cache, reuse the last fmu compiled by this process
+        return fmupath
+    compile_fmu(con['model_class'], 
+            [mopath],
+            # compiler_options={"state_initial_equations":True},
+            compile_to=compile_to,
+            jvm_args='-Xmx5g',
+            **_compile_options(con))
+    _compiled[fmupath] = key
+    if cache is not None:
+        fmupath = cache.put(key, fmupath)
+    return fmupath
     
    
     
@@ -162,6 +506,10 @@ class TestCase(object):
         '''
         # Preparing the inputs for generating the model
         self.con = con
+        # Timing and solver histograms, kept when the test case is 
+        # constructed again by ``set_scenario``
+        if not hasattr(self, 'metrics'):
+            self.metrics = Metrics()
         with open(con['config']) as f: 
              data = f.read() 
         self.config = json.loads(data) 
@@ -170,40 +518,29 @@ class TestCase(object):
         self.info = json.loads(data)       
    
                 
+        self.ios = {} 
+        for key in self.info:
+            if self.info[key]['type'] == 'output' or self.info[key]['type'] == 'input':
+                self.ios[key]={'name': key}
         if 'scenario' in con:
             self.scenario = self.con['scenario']
         else:
-            self.ios = {} 
-            for key in self.info:
-                if self.info[key]['type'] == 'output' or self.info[key]['type'] == 'input':
-                    self.ios[key]={'name': key}
             self.scenario = self.ios                       
         self.model_class = self.con['model_class']            
-        self.model_template = templateEnv.get_template(con['model_template'])        
-        modifer = path2modifer(self.scenario,self.info,self.config)        
-        with open('./inner1','w') as f: 
-                f.write(modifer) 
-                    
-        IO = path2IO(self.ios,self.info,self.config)                    
-        with open('./inner2','w') as f: 
-                f.write(IO)                 
-                
-        output = self.model_template.render(inner1='inner1',inner2='inner2')       
-        with open('./fmu/test.mo','w') as f: 
+        # In compile-once mode all fault blocks are bound to parameters 
+        # that are set on the loaded fmu by ``set_scenario``
+        self.compile_once = con.get('compile_once', False)
+        output = generate_model(self.con,self.info,self.config,self.scenario)
+        # Model files are written to ``build_dir`` if given, e.g. by worker 
+        # processes compiling concurrently
+        build_dir = con.get('build_dir')
+        mopath = './fmu/test.mo' if build_dir is None else os.path.join(build_dir,'test.mo')
+        with open(mopath,'w') as f: 
                  f.write(output) 
                  
-        modelpath=self.model_class
-        mopath=['./fmu/test.mo']
-        compile_fmu(modelpath, 
-                mopath,
-                compiler_log_level='error',
-                # compiler_options={"state_initial_equations":True},
-                target='me',
-                version='2.0',
-                jvm_args='-Xmx5g')
-                        
         # Define simulation model
-        self.fmupath = '{}.fmu'.format(self.model_class)
+        self.model_hash = model_hash(self.con,output)
+        self.fmupath = compile_model(self.con,output,mopath,compile_to=build_dir or '.')
         # Load fmu
         self.fmu = load_fmu(self.fmupath)
         self.default_input_values = None
@@ -217,17 +554,50 @@ class TestCase(object):
         # Get available control inputs and outputs
         self.input_names = self.fmu.get_model_variables(causality = 2).keys()
         self.output_names = self.fmu.get_model_variables(causality = 3).keys()
+        self.input_mapper = InputMapper(self.input_names)
+        # Measurements extracted at every step, see ``set_subscription``
+        self.recorded = self.__subscribe(con.get('subscription'))
         # Set default communication step
-        self.set_step(con['step'])
+        self.set_step(con['step'], con.get('step_align', False))
+        self.set_events(con.get('events', []))
+        # Input schedule applied where the client does not set an input
+        self.set_schedule(con.get('schedule'))
         # Set default fmu simulation options
         self.options = self.fmu.simulate_options()
-        self.options['CVode_options']['rtol'] = 1e-6 
+        self.target = con.get('target', 'me')
+        if self.target == 'me':
+            self.options['CVode_options']['rtol'] = 1e-6 
+        if 'ncp' in con:
+            self.options['ncp'] = con['ncp']
         # Set initial fmu simulation start
         self.start_time = 0
+        self.step_origin = 0
         self.initialize_fmu = True
         self.options['initialize'] = self.initialize_fmu
         # Initialize simulation data arrays
         self.__initilize_data()
+        if self.target == 'me':
+            # Keep results in memory and only record the test case variables
+            self.options['result_handling'] = con.get('result_handling', 'memory')
+        self.__initialize_recording()
+        # Set fault parameters
+        if self.compile_once:
+            self.__set_fault_parameters()
+        # Saved states of the test case, oldest first, see ``snapshot``
+        self.snapshots = collections.OrderedDict()
+        self.max_snapshots = con.get('max_snapshots', 10)
+
+    def __set_fault_parameters(self):
+        '''Sets the fault parameters of the current scenario on the fmu.
+        
+        Only used in compile-once mode. Has to be called after every reset
+        of the fmu since parameters are then restored to their defaults.
+        
+        '''
+        
+        parameters = scenario2parameters(self.scenario,self.info,self.config)
+        names = sorted(parameters.keys())
+        self.fmu.set(names, [parameters[name] for name in names])
 
     def __initilize_data(self):
         '''Initializes objects for simulation data storage.
@@ -245,18 +615,139 @@ class TestCase(object):
         
         '''
     
-        # Outputs data
+        # Outputs data, only the subscribed measurements
         self.y = {'time':[]}
-        for key in self.output_names:
+        for key in self.recorded:
             self.y[key] = []
-        self.y_store = copy.deepcopy(self.y)
+        self.y_store = ColumnStore(self.output_names, capacity=self.con.get('result_capacity'))
         # Inputs data
         self.u = {'time':[]}
         for key in self.input_names:
             self.u[key] = []        
-        self.u_store = copy.deepcopy(self.u)
+        self.u_store = ColumnStore(self.input_names, capacity=self.con.get('result_capacity'))
                 
-    def __simulation(self,start_time,end_time,input_object=None):
+    def __subscribe(self, names):
+        '''Returns the measurements to record for a subscription, in the 
+        order of the outputs of the fmu.'''
+        
+        if names is None:
+            return list(self.output_names)
+        if not names:
+            raise ValueError('A subscription requires at least one measurement, null subscribes all.')
+        for key in names:
+            if key not in self.output_names:
+                raise ValueError('Unknown measurement {}.'.format(key))
+        names = set(names)
+        
+        return [key for key in self.output_names if key in names]
+
+    def __initialize_recording(self):
+        '''Restricts the variables read from the fmu to the subscribed 
+        measurements and the control inputs.'''
+        
+        if self.target == 'cs':
+            self.__initialize_stepping()
+        else:
+            self.options['filter'] = [_glob_escape(key) for key in 
+                                      list(self.y.keys())+list(self.u.keys()) if key != 'time']
+
+    def __initialize_stepping(self):
+        '''Prepares the value references used to step a co-simulation fmu.
+        
+        Real and boolean variables are read with one call each instead of 
+        looking up every variable by name on every step.
+        
+        '''
+        
+        self.step_names = [key for key in list(self.y.keys())+list(self.u.keys()) if key != 'time']
+        self.step_real = []
+        self.step_boolean = []
+        for i, name in enumerate(self.step_names):
+            ref = self.fmu.get_variable_valueref(name)
+            if self.fmu.get_variable_data_type(name) == 0:
+                self.step_real.append((i, ref))
+            else:
+                self.step_boolean.append((i, ref))
+        self.step_real = (np.array([i for i, ref in self.step_real], dtype=int), 
+                          [ref for i, ref in self.step_real])
+        self.step_boolean = (np.array([i for i, ref in self.step_boolean], dtype=int), 
+                             [ref for i, ref in self.step_boolean])
+
+    def __get_step_values(self, values):
+        '''Reads the stepped variables of a co-simulation fmu into values.'''
+        
+        index, refs = self.step_real
+        if refs:
+            values[index] = self.fmu.get_real(refs)
+        index, refs = self.step_boolean
+        if refs:
+            values[index] = self.fmu.get_boolean(refs)
+
+    def __do_steps(self,start_time,end_time,input_object=None,points=None):
+        '''Simulates a co-simulation fmu with successive do_step calls.
+        
+        The solver of the fmu is only initialized when the fmu is 
+        initialized and then continues from one call to the next. 
+        ``do_step`` is called once per communication step, split where the
+        inputs change, and results are recorded at the end of each call.
+        
+        Parameters
+        ----------
+        start_time: int
+            Start time of simulation in seconds.
+        final_time: int
+            Final time of simulation in seconds.
+        input_object: pyfmi input_object, optional
+            Input object for simulation
+            Default is None
+        points: numpy array, optional
+            Ends of the communication steps between start_time and 
+            end_time, e.g. of ``advance_batch``.
+            Default is None, one step.
+        
+        Returns
+        -------
+        res: dict
+            Trajectories of the measurements and control inputs.
+            {'time':<time>, <variable_name>:<trajectory>}
+        
+        '''
+        
+        if self.initialize_fmu:
+            self.fmu.initialize(start_time=start_time, tolerance=1e-6)
+            self.initialize_fmu = False
+        t = [start_time, end_time]
+        if points is not None:
+            t.extend(points)
+        if input_object is not None:
+            u_list, u_trajectory = input_object
+            u_trajectory = np.atleast_2d(u_trajectory)
+            t.extend(u_trajectory[:,0])
+        t = np.unique(np.clip(t, start_time, end_time))
+        values = np.empty((len(t), len(self.step_names)))
+        if input_object is not None:
+            # Row of the input that applies during each point, step changes
+            # are given by repeated times
+            rows = np.maximum(np.searchsorted(u_trajectory[:,0], t, side='right') - 1, 0)
+        row = None
+        if input_object is not None:
+            row = rows[0]
+            self.fmu.set(u_list, u_trajectory[row,1:])
+        # Also the only point if start_time equals end_time
+        self.__get_step_values(values[0])
+        for i in range(len(t)-1):
+            if input_object is not None and rows[i] != row:
+                row = rows[i]
+                self.fmu.set(u_list, u_trajectory[row,1:])
+            self.fmu.do_step(t[i], t[i+1]-t[i], True)
+            self.__get_step_values(values[i+1])
+        res = {'time':t}
+        for i, name in enumerate(self.step_names):
+            res[name] = values[:,i]
+            
+        return res
+
+    def __simulation(self,start_time,end_time,input_object=None,points=None):
         '''Simulates the FMU using the pyfmi fmu.simulate function.
         
         Parameters
@@ -268,6 +759,9 @@ class TestCase(object):
         input_object: pyfmi input_object, optional
             Input object for simulation
             Default is None
+        points: numpy array, optional
+            Ends of the communication steps, only used by co-simulation.
+            Default is None, one step.
         
         Returns
         -------
@@ -276,6 +770,11 @@ class TestCase(object):
         
         '''
 
+        tic = time.time()
+        if self.target == 'cs':
+            res = self.__do_steps(start_time,end_time,input_object,points)
+            self.metrics.observe('step_phase_seconds', time.time()-tic, 'solver')
+            return res
         # Set fmu initialization option
         self.options['initialize'] = self.initialize_fmu
         # Simulate fmu
@@ -292,10 +791,14 @@ class TestCase(object):
                                      options=self.options, 
                                      input=input_object)        
         self.initialize_fmu = False
+        self.metrics.observe('step_phase_seconds', time.time()-tic, 'solver')
+        solver = getattr(res, 'solver', None)
+        if solver is not None:
+            solver_statistics(self.metrics, solver.statistics)
 
         return res            
 
-    def __get_results(self, res, store=False):
+    def __get_results(self, res, store=False, rows=None):
         '''Get results at the end of a simulation and throughout the 
         simulation period for storage. This method assigns these results
         to `self.y` and, if `store=True`, also to `self.y_store` and 
@@ -311,24 +814,33 @@ class TestCase(object):
         store: boolean
             Set to true if desired to store results in `self.y_store` and
             `self.u_store`
+        rows: numpy array, optional
+            Points of the results that end a step, only these are stored
+            unless ``result_points`` is ``all`` in the configuration.
+            Default is None, the last point.
         
         '''
         
         # Get result and store measurement
-
+        tic = time.time()
         for key in self.y.keys():
             self.y[key] = res[key][-1]
-            if store:
-
-                self.y_store[key].append(res[key].tolist()[1:])
-
-        
-        # Store control inputs
+        toc = time.time()
+        self.metrics.observe('step_phase_seconds', toc-tic, 'extraction')
         if store:
-            for key in self.u.keys():
-
-                self.u_store[key].append(res[key].tolist()[1:])
-
+            # One point per step, or every output point of the simulation
+            if self.con.get('result_points', 'step') == 'all':
+                rows = slice(1, None)
+            elif rows is None:
+                rows = [-1]
+            # Measurements that are not subscribed are stored as NaN
+            self.y_store.append(np.asarray(res['time'])[rows],
+                                np.column_stack([np.asarray(res[key])[rows] for key in self.recorded]),
+                                names=None if len(self.recorded) == len(self.output_names) else self.recorded)
+            # Store control inputs
+            self.u_store.append(np.asarray(res['time'])[rows],
+                                np.column_stack([np.asarray(res[key])[rows] for key in self.u_store.names]))
+            self.metrics.observe('step_phase_seconds', time.time()-toc, 'storage')
 
     def advance(self,u):
         '''Advances the test case model simulation forward one step.
@@ -342,7 +854,8 @@ class TestCase(object):
         Returns
         -------
         y : dict
-            Contains the measurement data at the end of the step.
+            Contains the measurement data at the end of the step, whose
+            ``time`` is the end of the step, see ``set_step``.
             {<measurement_name> : <measurement_value>}
             
         '''
@@ -350,12 +863,16 @@ class TestCase(object):
 
             
         # Set final time
-        self.final_time = self.start_time + self.step
+        self.final_time = self.__next_boundary(self.start_time)
         # Set control inputs if they exist and are written
         # Check if possible to overwrite
         # if len(u) == 0:        
             # u = self.default_input_values
-        input_object = _process_input(u, self.start_time)
+        tic = time.time()
+        if self.schedule is not None:
+            u = self.__scheduled(u, self.start_time)
+        input_object = self.input_mapper(u, self.start_time)
+        self.metrics.observe('step_phase_seconds', time.time()-tic, 'input')
         # Simulate
 #        print(input_object)
         res = self.__simulation(self.start_time,self.final_time,input_object) 
@@ -363,11 +880,12 @@ class TestCase(object):
         # Process results
         if res is not None:        
             # Get result and store measurement and control inputs
-            self.__get_results(res)
+            self.__get_results(res, store=True)
             # Advance start time
             self.start_time = self.final_time
             # Raise the flag to compute time lapse
             self.tic_time = time.time()
+            self.metrics.observe('step_phase_seconds', self.tic_time-tic, 'total')
 
             return self.y
 
@@ -375,6 +893,112 @@ class TestCase(object):
 
             return None        
 
+    def advance_batch(self, n_steps=None, trajectory=None):
+        '''Advances the test case model simulation forward several steps 
+        in a single simulation.
+        
+        Parameters
+        ----------
+        n_steps : int, optional
+            Number of steps.
+            Default is None, the number of times in `trajectory`.
+        trajectory : dict, optional
+            Defines the control input data indexed by time. A value applies
+            from its time until the next time.
+            {'time':[<time>], <input_name>:[<input_value>]}
+            Default is None, no input is written.
+            
+        Returns
+        -------
+        ys : list
+            Contains the measurement data at the end of each step.
+            [{<measurement_name> : <measurement_value>}]
+            
+        '''
+        
+        if n_steps is None:
+            if trajectory is None:
+                raise ValueError('Either n_steps or trajectory is required.')
+            n_steps = len(trajectory['time'])
+        n_steps = int(n_steps)
+        if n_steps < 1:
+            raise ValueError('n_steps must be positive.')
+        if self.step_align:
+            final_times = []
+            for i in range(n_steps):
+                final_times.append(self.__next_boundary(final_times[-1] if final_times else self.start_time))
+            final_times = np.array(final_times)
+            start_times = np.concatenate(([self.start_time], final_times[:-1]))
+        else:
+            start_times = self.start_time + self.step*np.arange(n_steps)
+            final_times = start_times + self.step
+        self.final_time = final_times[-1]
+        tic = time.time()
+        input_object = None
+        scheduled = None
+        if self.schedule is not None:
+            scheduled = self.schedule.at(start_times)
+        if trajectory is not None or scheduled is not None:
+            trajectory = trajectory or {'time':[]}
+            if len(trajectory) > 1 and len(trajectory['time']) == 0:
+                raise ValueError('The input trajectory has no time.')
+            for key in trajectory.keys():
+                if key != 'time' and key not in self.u:
+                    raise ValueError('Unknown input {}.'.format(key))
+                if len(trajectory[key]) != len(trajectory['time']):
+                    raise ValueError('Input {} and time have different lengths.'.format(key))
+            keys = sorted(set(key for key in trajectory.keys() if key != 'time') | set(scheduled or {}))
+            initial = dict(zip(keys, self.__read(keys))) if keys else {}
+            input_object = _process_trajectory(trajectory, start_times, final_times, initial, scheduled)
+        self.metrics.observe('step_phase_seconds', time.time()-tic, 'input')
+        if self.step_align:
+            # Output points of one simulation are evenly spaced, steps of
+            # different lengths are simulated one after the other
+            ys = []
+            for start_time, final_time in zip(start_times, final_times):
+                res = self.__simulation(start_time,final_time,input_object)
+                if res is None:
+                    return None
+                self.__get_results(res, store=True)
+                self.start_time = final_time
+                ys.append(dict(self.y))
+            self.tic_time = time.time()
+            self.metrics.observe('step_phase_seconds', self.tic_time-tic, 'total')
+
+            return ys
+        # Output points at every step boundary, only one point per step is
+        # stored unless all points are recorded
+        ncp = self.options['ncp']
+        if self.con.get('result_points', 'step') == 'all':
+            self.options['ncp'] = ncp*n_steps
+        else:
+            self.options['ncp'] = n_steps
+        try:
+            res = self.__simulation(self.start_time,self.final_time,input_object,final_times)
+        finally:
+            self.options['ncp'] = ncp
+            
+        # Process results
+        if res is not None:        
+            # Last result point of each step, events may add points
+            t = res['time']
+            index = np.searchsorted(t, final_times + 1e-6*self.step, side='right') - 1
+            self.__get_results(res, store=True, rows=index)
+            ys = []
+            for i in index:
+                ys.append(dict((key, res[key][i]) for key in self.y.keys()))
+            # Advance start time
+            self.start_time = self.final_time
+            # Raise the flag to compute time lapse
+            self.tic_time = time.time()
+            self.metrics.observe('step_phase_seconds', self.tic_time-tic, 'total')
+
+            return ys
+
+        else:
+
+            return None        
+
     def initialize(self, start_time, warmup_period):
         '''Initialize the test simulation.
         
@@ -395,14 +1019,29 @@ class TestCase(object):
 
         # Reset fmu
         self.fmu.reset()
+        if self.compile_once:
+            self.__set_fault_parameters()
         # Reset simulation data storage
         self.__initilize_data()
         # Set fmu intitialization                
         self.initialize_fmu = True
+        # Restore the state after the same warmup if it is cached
+        cache = _warmup_cache(self.con)
+        if cache is not None:
+            key = cache_key(self.model_hash, self.get_scenario(), self.default_input_values, 
+                            self.target, start_time, warmup_period)
+            cached = cache.get_bytes(key)
+            if cached is not None:
+                state = pickle.loads(cached)
+                self.__load_fmu_state(state['fmu_state'])
+                self.__restore_measurements(state['y'])
+                self.start_time = start_time
+                self.step_origin = start_time
+                return self.y
         # Simulate fmu for warmup period.
         # Do not allow negative starting time to avoid confusions
         if self.default_input_values is not None:
-             input_object = _process_input(self.default_input_values,start_time)
+             input_object = self.input_mapper(self.default_input_values,start_time)
              res = self.__simulation(max(start_time-warmup_period,0), start_time, input_object = input_object)        
         else:
              res = self.__simulation(max(start_time-warmup_period,0), start_time)
@@ -412,6 +1051,10 @@ class TestCase(object):
             self.__get_results(res, store=False)
             # Set internal start time to start_time
             self.start_time = start_time
+            self.step_origin = start_time
+            if cache is not None:
+                state = {'fmu_state':self.__save_fmu_state(), 'y':dict(self.y)}
+                cache.put_bytes(key, pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
 
             return self.y
         
@@ -424,13 +1067,19 @@ class TestCase(object):
 
         return self.step
 
-    def set_step(self,step):
+    def set_step(self,step,align=None):
         '''Sets the simulation step in seconds.
         
         Parameters
         ----------
         step : int
             Simulation step in seconds.
+        align : boolean, optional
+            True to end each step at the earliest of the next step 
+            boundary, fault time of the scenario and event time (see 
+            ``set_events``), so that large steps do not skip them. Step
+            boundaries are multiples of the step from the current time.
+            Default is None, unchanged.
             
         Returns
         -------
@@ -438,9 +1087,116 @@ class TestCase(object):
         
         '''
         
-        self.step = float(step)
+        step = float(step)
+        if step <= 0:
+            raise ValueError('The step must be positive.')
+        self.step = step
+        self.step_origin = getattr(self, 'start_time', 0)
+        if align is not None:
+            self.step_align = self.con['step_align'] = bool(align)
         
         return None
+
+    def get_events(self):
+        '''Returns the event times at which aligned steps end, besides the
+        fault times of the scenario.'''
+
+        return list(self.con.get('events', []))
+
+    def set_events(self, times):
+        '''Sets the event times at which aligned steps end.
+        
+        Parameters
+        ----------
+        times : list
+            Simulation times in seconds, e.g. changes of an input schedule.
+            
+        Returns
+        -------
+        None
+        
+        '''
+        
+        self.con['events'] = sorted(set(float(t) for t in times))
+        
+        return None
+
+    def get_schedule(self):
+        '''Returns the input schedule, None if there is none.
+        
+        Returns
+        -------
+        schedule : dict
+            {'time':[<time>], 'values':{<input_name>:[<value>]},
+             'interpolation':<interpolation>}, see ``InputSchedule``.
+             
+        '''
+        
+        return self.con.get('schedule')
+
+    def set_schedule(self, schedule):
+        '''Sets the input schedule applied by ``advance`` and 
+        ``advance_batch`` to the inputs that the client does not set.
+        
+        The times at which held values change are event times of aligned
+        steps, see ``set_step``.
+        
+        Parameters
+        ----------
+        schedule : dict
+            Definition of the schedule, see ``InputSchedule``, None to 
+            remove the schedule.
+            
+        Returns
+        -------
+        None
+        
+        '''
+        
+        if schedule is None:
+            self.schedule = None
+            self.schedule_events = []
+            self.con['schedule'] = None
+            return None
+        self.schedule = InputSchedule(schedule, self.input_names)
+        self.schedule_events = self.schedule.change_times()
+        self.con['schedule'] = self.schedule.definition()
+        
+        return None
+
+    def __scheduled(self, u, start_time):
+        '''Returns the inputs of a step, the scheduled values of the inputs
+        that are not set in u.'''
+        
+        values = self.schedule.at(start_time)
+        for key, value in u.items():
+            if value is not None and value != '' and value == value:
+                values[key] = value
+        
+        return values
+
+    def __next_boundary(self, start_time):
+        '''Returns the end of a step starting at start_time.'''
+
+        if not self.step_align:
+            return start_time + self.step
+        # Times closer than eps to the start belong to the previous step
+        eps = 1e-9*max(1., abs(start_time))
+        n = np.floor((start_time + eps - self.step_origin)/self.step) + 1
+        final_time = self.step_origin + n*self.step
+        for key in self.scenario:
+            fault = self.scenario[key]
+            if isinstance(fault, dict) and fault.get('fault_time') is not None:
+                fault_time = float(fault['fault_time'])
+                if start_time + eps < fault_time < final_time:
+                    final_time = fault_time
+        for events in (self.con.get('events'), self.schedule_events):
+            if events:
+                i = bisect.bisect_right(events, start_time + eps)
+                if i < len(events) and events[i] < final_time:
+                    final_time = events[i]
+
+        return float(final_time)
         
     def get_inputs(self):
         '''Returns a dictionary of control inputs and their meta-data.
@@ -478,28 +1234,110 @@ class TestCase(object):
         
         return measurements
         
-    def get_results(self):
+    def get_results(self, start=None, end=None, signals=None, cursor=None,
+                    decimate=None, resample=None):
         '''Returns measurement and control input trajectories.
         
         Parameters
         ----------
-        None
+        start : float, optional
+            Start of the time window in seconds.
+            Default is None, from the first stored sample.
+        end : float, optional
+            End of the time window in seconds.
+            Default is None, until the last stored sample.
+        signals : list, optional
+            Names of the measurements and control inputs to return.
+            Default is None, all signals.
+        cursor : int, optional
+            Cursor returned by a previous call, only samples stored since
+            that call are returned.
+            Default is None.
+        decimate : int, optional
+            Only return every `decimate`-th sample.
+            Default is None.
+        resample : float, optional
+            Interpolate the trajectories with this interval in seconds.
+            Default is None.
         
         Returns
         -------
         Y : dict
             Dictionary of measurement and control input names and their 
-            trajectories as lists.
+            trajectories as lists, and the cursor of the last sample.
             {'y':{<measurement_name>:<measurement_trajectory>},
-             'u':{<input_name>:<input_trajectory>}
+             'u':{<input_name>:<input_trajectory>},
+             'cursor':<cursor>
             }
         
         '''
         
-        Y = {'y':self.y_store, 'u':self.u_store}
+        if signals is not None:
+            for key in signals:
+                if key not in self.y_store.index and key not in self.u_store.index:
+                    raise ValueError('Unknown signal {}.'.format(key))
+        if decimate is not None and int(decimate) < 1:
+            raise ValueError('decimate must be positive.')
+        if resample is not None and float(resample) <= 0:
+            raise ValueError('resample must be positive.')
+        Y = {}
+        for group, store in (('y', self.y_store), ('u', self.u_store)):
+            names = store.names
+            if signals is not None:
+                names = [key for key in signals if key in store.index]
+            t, data, next_cursor = store.query(start, end, names, cursor, decimate, resample)
+            Y[group] = {'time':t.tolist()}
+            for i, key in enumerate(names):
+                Y[group][key] = data[:,i].tolist()
+        Y['cursor'] = next_cursor
         
         return Y
                 
+    def get_result_arrays(self, start=None, end=None, signals=None):
+        '''Returns measurement and control input trajectories as arrays,
+        along with the metadata of the signals for binary export.
+        
+        Parameters
+        ----------
+        start : float, optional
+            Start of the time window in seconds.
+            Default is None, from the first stored sample.
+        end : float, optional
+            End of the time window in seconds.
+            Default is None, until the last stored sample.
+        signals : list, optional
+            Names of the measurements and control inputs to return.
+            Default is None, all signals.
+        
+        Returns
+        -------
+        table : dict
+            {'time':<time_array>, 
+             'columns':[(<signal_name>, <trajectory_array>)],
+             'metadata':{<signal_name>:<signal_metadata>}
+            }
+        
+        '''
+        
+        if signals is not None:
+            for key in signals:
+                if key not in self.y_store.index and key not in self.u_store.index:
+                    raise ValueError('Unknown signal {}.'.format(key))
+        columns = []
+        for store in (self.y_store, self.u_store):
+            names = store.names
+            if signals is not None:
+                names = [key for key in signals if key in store.index]
+            t, data, next_cursor = store.query(start, end, names)
+            for i, key in enumerate(names):
+                columns.append((key, data[:,i]))
+        metadata = signal_metadata([key for key, values in columns], self.info)
+        # The time is a view of the store, the columns are selected into 
+        # copies. Exports are streamed after the lock of the session is 
+        # released, when later steps may overwrite a ring buffer.
+        
+        return {'time':np.array(t), 'columns':columns, 'metadata':metadata}
+
     def get_faults(self):
         '''Returns the name of the test case fmu.
         
@@ -571,5 +1409,260 @@ class TestCase(object):
             
         '''        
         self.con['scenario'] = scenario        
-        self.__init__(self.con)
-        return None          
\ No newline at end of file
+        if not self.compile_once:
+            with construction:
+                self.__init__(self.con)
+            return None
+        # Only set the fault parameters on the loaded fmu
+        self.scenario = scenario
+        self.fmu.reset()
+        self.__set_fault_parameters()
+        self.initialize_fmu = True
+        self.start_time = 0
+        self.step_origin = 0
+        self.__initilize_data()
+        return None
+
+    def __save_fmu_state(self):
+        '''Returns the serialized state of the fmu.'''
+        
+        fmu_state = self.fmu.get_fmu_state()
+        try:
+            return self.fmu.serialize_fmu_state(fmu_state)
+        finally:
+            self.fmu.free_fmu_state(fmu_state)
+
+    def __load_fmu_state(self, serialized):
+        '''Restores a serialized state of the fmu, the solver continues 
+        from it instead of initializing the fmu.'''
+        
+        fmu_state = self.fmu.deserialize_fmu_state(serialized)
+        try:
+            self.fmu.set_fmu_state(fmu_state)
+        finally:
+            self.fmu.free_fmu_state(fmu_state)
+        self.initialize_fmu = False
+
+    def __read(self, names):
+        '''Reads the current values of variables of the fmu as floats, 
+        ``fmu.get`` returns an array per variable.'''
+        
+        return [float(np.ravel(value)[0]) for value in self.fmu.get(names)]
+
+    def __restore_measurements(self, y):
+        '''Sets the current measurements from saved ones, measurements
+        subscribed since are read from the fmu.'''
+        
+        missing = [key for key in self.recorded if key not in y]
+        self.y = {'time':y['time']}
+        for key in self.recorded:
+            self.y[key] = y.get(key)
+        if missing:
+            self.y.update(zip(missing, self.__read(missing)))
+
+    def get_state(self):
+        '''Returns the complete state of the test case.
+        
+        Parameters
+        ----------
+        None
+        
+        Returns
+        -------
+        state : dict
+            Serialized fmu state together with the simulation time, step, 
+            scenario, current measurements and stored results. It can be
+            restored with ``set_state`` by any test case of the same model.
+            
+        '''
+        
+        if self.initialize_fmu:
+            raise RuntimeError('The test case has to be initialized or advanced before its state is saved.')
+        
+        return {'model_hash':self.model_hash,
+                'fmu_state':self.__save_fmu_state(),
+                'start_time':self.start_time,
+                'step':self.step,
+                'step_origin':self.step_origin,
+                'scenario':copy.deepcopy(self.scenario),
+                'y':dict(self.y),
+                'y_store':copy.deepcopy(self.y_store),
+                'u_store':copy.deepcopy(self.u_store)}
+
+    def set_state(self, state):
+        '''Restores a state returned by ``get_state``.
+        
+        Parameters
+        ----------
+        state : dict
+            State of a test case of the same model.
+        
+        Returns
+        -------
+        y : dict
+            Contains the measurement data of the restored state.
+            {<measurement_name> : <measurement_value>}
+            
+        '''
+        
+        if state['model_hash'] != self.model_hash:
+            raise ValueError('The state was saved by a test case of a different model.')
+        self.__load_fmu_state(state['fmu_state'])
+        self.start_time = state['start_time']
+        self.step = state['step']
+        self.step_origin = state.get('step_origin', self.start_time)
+        self.scenario = copy.deepcopy(state['scenario'])
+        self.con['scenario'] = self.scenario
+        self.__restore_measurements(state['y'])
+        # Copies, so that a state can be restored several times
+        self.y_store = copy.deepcopy(state['y_store'])
+        self.u_store = copy.deepcopy(state['u_store'])
+        
+        return self.y
+
+    def snapshot(self):
+        '''Saves the current state of the test case.
+        
+        A snapshot holds a copy of the stored results, only the most recent
+        ``max_snapshots`` are kept.
+        
+        Returns
+        -------
+        snapshot_id : string
+            Identifier of the snapshot, see ``restore``.
+            
+        '''
+        
+        snapshot_id = uuid.uuid4().hex
+        self.snapshots[snapshot_id] = self.get_state()
+        while len(self.snapshots) > self.max_snapshots:
+            self.snapshots.popitem(last=False)
+        
+        return snapshot_id
+
+    def get_snapshot(self, snapshot_id):
+        '''Returns the state saved by a snapshot, None if it does not exist.'''
+        
+        return self.snapshots.get(snapshot_id)
+
+    def get_snapshots(self):
+        '''Returns the snapshots of the test case.
+        
+        Returns
+        -------
+        snapshots : dict
+            Simulation time of each snapshot.
+            {<snapshot_id> : <time>}
+            
+        '''
+        
+        return dict((key, state['start_time']) for key, state in self.snapshots.items())
+
+    def delete_snapshot(self, snapshot_id):
+        '''Deletes a snapshot, returns False if it does not exist.'''
+        
+        return self.snapshots.pop(snapshot_id, None) is not None
+
+    def restore(self, snapshot_id):
+        '''Restores the state saved by a snapshot.
+        
+        A snapshot can be restored any number of times, e.g. to run several
+        controllers from the same warmed-up state.
+        
+        Parameters
+        ----------
+        snapshot_id : string
+            Identifier of the snapshot.
+        
+        Returns
+        -------
+        y : dict
+            Contains the measurement data of the restored state.
+            {<measurement_name> : <measurement_value>}
+            
+        '''
+        
+        if snapshot_id not in self.snapshots:
+            raise ValueError('Unknown snapshot {}.'.format(snapshot_id))
+        
+        return self.set_state(self.snapshots[snapshot_id])
+
+    def get_subscription(self):
+        '''Returns the subscribed measurements.
+        
+        Returns
+        -------
+        measurements : list
+            Names of the measurements extracted, stored and returned at
+            every step.
+            
+        '''
+        
+        return list(self.recorded)
+
+    def set_subscription(self, names=None):
+        '''Sets the measurements extracted, stored and returned at every 
+        step. Stored results of the other measurements are NaN, their 
+        current values are available with ``get_measurement_values``.
+        
+        Parameters
+        ----------
+        names : list, optional
+            Names of the measurements.
+            Default is None, all measurements.
+        
+        Returns
+        -------
+        measurements : list
+            Names of the subscribed measurements.
+            
+        '''
+        
+        self.recorded = self.__subscribe(names)
+        # Kept for test cases constructed again by ``set_scenario``
+        self.con['subscription'] = names
+        y = self.y
+        self.y = {'time':y['time']}
+        for key in self.recorded:
+            self.y[key] = y.get(key, [])
+        missing = [key for key in self.recorded if key not in y]
+        if missing and not self.initialize_fmu:
+            self.y.update(zip(missing, self.__read(missing)))
+        self.__initialize_recording()
+        
+        return list(self.recorded)
+
+    def get_measurement_values(self, names=None):
+        '''Returns the current values of measurements, whether subscribed
+        or not, read from the fmu.
+        
+        Parameters
+        ----------
+        names : list, optional
+            Names of the measurements.
+            Default is None, all measurements.
+        
+        Returns
+        -------
+        y : dict
+            {'time':<time>, <measurement_name> : <measurement_value>}
+            
+        '''
+        
+        if names is None:
+            names = list(self.output_names)
+        for key in names:
+            if key not in self.output_names:
+                raise ValueError('Unknown measurement {}.'.format(key))
+        if self.initialize_fmu:
+            raise RuntimeError('The test case has to be initialized or advanced before measurements are read.')
+        y = {'time':self.start_time}
+        y.update(zip(names, self.__read(names)))
+        
+        return y
+
+    def get_metrics(self):
+        '''Returns the timing and solver histograms of the test case, see
+        ``Metrics.snapshot``.'''
+        
+        return self.metrics.snapshot()
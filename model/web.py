@@ -7,52 +7,188 @@ The API is implemented using the ``flask`` package.
 
 # GENERAL PACKAGE IMPORT
 # ----------------------
-from flask import Flask, request
-from flask_restful import Resource, Api, reqparse
+from flask import Flask, request, Response, g
+from flask_restful import Resource, Api, reqparse, abort
+from flask_restful.representations.json import output_json
 import json
+import time
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+from schema import InputSchema, ScenarioSchema, SchemaError
 # ----------------------
 
 # -----------------------
 
 # DEFINE REST REQUESTS
 # --------------------
-class Advance(Resource):
+def _body():
+    """Returns the json body of a request, or its form data and arguments."""
+    data = request.get_json(silent=True)
+    if data is None:
+        return request.values
+    return data
+
+def _input_schema(case, strict=False):
+    """
+    Returns the input schema of a test case, shared by its input names.
+    Unknown keys are rejected if ``strict``, which is set by
+    ``"strict_inputs"`` in the configuration of the server.
+    """
+    key = (tuple(case.get_inputs()), strict)
+    schema = _input_schemas.get(key)
+    if schema is None:
+        schema = _input_schemas[key] = InputSchema(*key)
+    return schema
+
+# Input schemas of the test cases, by input names and strictness
+_input_schemas = {}
+
+def _session_exists(sessions, session_id):
+    """Aborts with 404 if a session is given and does not exist, starting or not."""
+    if session_id is not None and sessions.get_lock(session_id) is None:
+        abort(404, message='Unknown session {}.'.format(session_id))
+
+def _asynchronous():
+    """
+    Returns true if the client asks for a job handle instead of waiting,
+    with the query argument ``async`` or the header ``Prefer: respond-async``.
+    """
+    if request.args.get('async', 'false').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'respond-async' in request.headers.get('Prefer', '')
+
+class CaseResource(Resource):
+    """
+    Base of the interfaces to a test case. The test case is the one of the
+    session in the URL, or of the default session. Requests of a session
+    are serialized unless ``locked`` is false, e.g. for metadata, or does
+    not list their method. Requests that change the simulation are refused
+    during a paced run if ``exclusive`` is true.
+    """
+
+    locked = True
+    exclusive = False
+
+    def __init__(self, **kwargs):
+        self.sessions = kwargs["sessions"]
+        self.jobs = kwargs.get("jobs")
+        self.runs = kwargs.get("runs", {})
+        self.strict_inputs = kwargs.get("strict_inputs", False)
+
+    def dispatch_request(self, *args, **kwargs):
+        self.session_id = g.session_id = kwargs.pop('session_id', 'default')
+        self.lock = self.sessions.get_lock(self.session_id)
+        self.case = self.sessions.get(self.session_id)
+        if self.lock is None:
+            abort(404, message='Unknown session {}.'.format(self.session_id))
+        if self.case is None:
+            # Returned instead of aborted, 5xx errors are logged with a traceback
+            return {'message': 'Session {} is starting, see GET ready.'.format(self.session_id)}, 503, {'Retry-After': '5'}
+        locked = self.locked if isinstance(self.locked, bool) else request.method in self.locked
+        if not locked:
+            return super(CaseResource, self).dispatch_request(*args, **kwargs)
+        with self.lock:
+            # Checked with the lock held, a run may have started while waiting
+            if self.exclusive and request.method != 'GET' and self.running():
+                abort(409, message='Session {} is in a paced run, see DELETE run.'.format(self.session_id))
+            return super(CaseResource, self).dispatch_request(*args, **kwargs)
+
+    def running(self):
+        """Returns the paced run of the session if it is running."""
+        run = self.runs.get(self.session_id)
+        if run is not None and run.status()['state'] == 'running':
+            return run
+        return None
+
+    def exclusive_job(self, function):
+        """Returns a job function that fails if a paced run started first."""
+        def job(*args):
+            if self.running():
+                raise RuntimeError('Session {} is in a paced run.'.format(self.session_id))
+            return function(*args)
+        return job
+
+    def run(self, function, *args):
+        """
+        Runs a slow operation, or queues it as a job if the client asks
+        for an asynchronous response.
+        """
+        if self.jobs is None or not _asynchronous():
+            return function(*args)
+        if self.exclusive:
+            function = self.exclusive_job(function)
+        job_id = self.jobs.submit(function, args, self.lock, self.session_id)
+        return {'job_id': job_id}, 202, {'Location': '/jobs/{}'.format(job_id)}
+
+class Advance(CaseResource):
     """Interface to advance the test case simulation."""
 
+    exclusive = True
+
     def __init__(self, **kwargs):
-        self.case = kwargs["case"]
-        self.parser_advance = kwargs["parser_advance"]
+        CaseResource.__init__(self, **kwargs)
 
     def post(self):
         """
         POST request with input data to advance the simulation one step 
-        and receive current measurements.
+        and receive current measurements. Inputs are given as an object or
+        as an array ordered like GET inputs.
         """
-        u = self.parser_advance.parse_args()
+        try:
+            u = _input_schema(self.case, self.strict_inputs).parse(_body())
+        except SchemaError as e:
+            abort(400, message=str(e))
         y = self.case.advance(u)
         return y
 
-class Reset(Resource):
+class AdvanceBatch(CaseResource):
+    """Interface to advance the test case simulation several steps."""
+
+    exclusive = True
+
+    def __init__(self, **kwargs):
+        CaseResource.__init__(self, **kwargs)
+
+    def post(self):
+        """
+        POST request with an input trajectory or a number of steps to 
+        advance the simulation and receive the measurements of every step.
+        """
+        args = request.get_json(force=True)
+        if not isinstance(args, dict):
+            abort(400, message='Expected {"n_steps":<n>, "inputs":{"time":[...], <input_name>:[...]}}.')
+        try:
+            return self.run(self.case.advance_batch, args.get('n_steps'), args.get('inputs'))
+        except (ValueError, TypeError, KeyError) as e:
+            abort(400, message=str(e))
+
+class Reset(CaseResource):
     """
     Interface to test case simulation step size.
     """
+
+    exclusive = True
     
     def __init__(self, **kwargs):
-            self.case = kwargs["case"]
+            CaseResource.__init__(self, **kwargs)
             self.parser_reset = kwargs["parser_reset"]
 
     def put(self):
         """PUT request to reset the test."""
         u = self.parser_reset.parse_args()
-        y = self.case.initialize(float(u['start_time']),float(u['end_time'])-float(u['start_time']))
-        return y
+        return self.run(self.case.initialize, float(u['start_time']),float(u['end_time'])-float(u['start_time']))
 
                
-class Step(Resource):
+class Step(CaseResource):
     """Interface to test case simulation step size."""
 
+    locked = ['PUT']
+    exclusive = True
+
     def __init__(self, **kwargs):
-            self.case = kwargs["case"]
+            CaseResource.__init__(self, **kwargs)
             self.parser_step = kwargs["parser_step"]
 
     def get(self):
@@ -60,41 +196,142 @@ class Step(Resource):
         return self.case.get_step()
 
     def put(self):
-        """PUT request to set simulation step in seconds."""
+        """
+        PUT request to set simulation step in seconds, with ``align=true``
+        to end steps at fault and event times as well.
+        """
         args = self.parser_step.parse_args()
         step = args['step']
-        self.case.set_step(step)
+        align = args['align']
+        if align is not None:
+            align = align.lower() in ('1', 'true', 'yes')
+        try:
+            self.case.set_step(step, align)
+        except (TypeError, ValueError) as e:
+            abort(400, message=str(e))
         return step, 201   
 
-class Faults(Resource):
-    """Interface to get the fault list."""
+class Events(CaseResource):
+    """Interface to the event times at which aligned steps end."""
+
+    def __init__(self, **kwargs):
+            CaseResource.__init__(self, **kwargs)
+
+    def get(self):
+        """GET request to receive the event times."""
+        return self.case.get_events()
+
+    def put(self):
+        """PUT request with a list of simulation times to set the event times."""
+        times = request.get_json(silent=True)
+        if not isinstance(times, list):
+            abort(400, message='Expected a list of times.')
+        try:
+            self.case.set_events(times)
+        except (TypeError, ValueError) as e:
+            abort(400, message=str(e))
+        return self.case.get_events()
+
+class Subscription(CaseResource):
+    """Interface to the measurements recorded at every step."""
+
+    def __init__(self, **kwargs):
+            CaseResource.__init__(self, **kwargs)
+
+    def get(self):
+        """GET request to receive the subscribed measurements."""
+        return self.case.get_subscription()
+
+    def put(self):
+        """
+        PUT request with a list of measurements, or null for all, to only
+        extract, store and return these measurements at every step.
+        """
+        names = request.get_json(silent=True)
+        if isinstance(names, dict):
+            names = names.get('measurements')
+        if names is not None and not isinstance(names, list):
+            abort(400, message='Expected a list of measurements or null.')
+        try:
+            return self.case.set_subscription(names)
+        except ValueError as e:
+            abort(400, message=str(e))
+
+class MeasurementValues(CaseResource):
+    """Interface to the current values of all measurements."""
 
     def __init__(self, **kwargs):
-            self.case = kwargs["case"]
+            CaseResource.__init__(self, **kwargs)
 
     def get(self):
+        """
+        GET request to receive the current values of the measurements, 
+        subscribed or not, optionally of ``signals=<name>,<name>``.
+        """
+        signals = request.args.get('signals')
+        try:
+            return self.case.get_measurement_values(None if not signals else signals.split(','))
+        except ValueError as e:
+            abort(400, message=str(e))
+        except RuntimeError as e:
+            abort(409, message=str(e))
+
+class Faults(Resource):
+    """
+    Interface to get the fault list, served from the test case information
+    without waiting for the model to compile.
+    """
+
+    def __init__(self, **kwargs):
+            self.info = kwargs["info"]
+            self.sessions = kwargs["sessions"]
+
+    def get(self, session_id=None):
         """GET request to receive the fault list."""
-        return self.case.get_faults()
+        _session_exists(self.sessions, session_id)
+        return list(self.info.keys())
 
 class Info(Resource):
     """Interface to get the detailed information of a selected fault."""
 
     def __init__(self, **kwargs):
-            self.case = kwargs["case"]
+            self.info = kwargs["info"]
+            self.sessions = kwargs["sessions"]
             self.parser_fault_info = kwargs["parser_fault_info"]
 
-    def get(self):
+    def get(self, session_id=None):
         """GET request to receive the fault information."""
+        _session_exists(self.sessions, session_id)
         args = self.parser_fault_info.parse_args()
         fault = args['fault']      
-        return self.case.get_fault_info(fault) 
+        return self.info.get(fault, {})
+
+class Ready(Resource):
+    """Interface to the readiness of the server."""
+
+    def __init__(self, **kwargs):
+            self.sessions = kwargs["sessions"]
+            self.jobs = kwargs["jobs"]
+            self.startup = kwargs["startup"]
+
+    def get(self):
+        """
+        GET request to receive whether the default session is constructed,
+        with status 503 while its model is compiled or if it failed.
+        """
+        if self.sessions.get('default') is not None:
+            return {'ready': True}
+        status = self.jobs.status(self.startup) or {}
+        return {'ready': False, 'state': status.get('state'), 'error': status.get('error')}, 503
         
-class Scenario(Resource):
+class Scenario(CaseResource):
     """Interface to test case simulation step size."""
 
+    exclusive = True
+
     def __init__(self, **kwargs):
-            self.case = kwargs["case"]
-            self.parser_fault_scenario = kwargs["parser_fault_scenario"]
+            CaseResource.__init__(self, **kwargs)
+            self.schema_fault_scenario = kwargs["schema_fault_scenario"]
 
     def get(self):
         """GET request to receive current simulation step in seconds."""
@@ -102,46 +339,477 @@ class Scenario(Resource):
 
     def put(self):
         """PUT request to set simulation step in seconds."""
-        args = self.parser_fault_scenario.parse_args()
+        try:
+            args = self.schema_fault_scenario.parse(_body())
+        except SchemaError as e:
+            abort(400, message=str(e))
         print args
-        self.case.set_scenario(args)
-        return None  
+        return self.run(self.case.set_scenario, args)
+
+class Farm(CaseResource):
+    """
+    Interface to compile fault scenarios in the background. The farm is
+    shared by the sessions, only activating a scenario uses the test case.
+    """
+
+    locked = ['PUT']
+    exclusive = True
+
+    def __init__(self, **kwargs):
+            CaseResource.__init__(self, **kwargs)
+            self.farm = kwargs["farm"]
+
+    def dispatch_request(self, *args, **kwargs):
+        if request.method == 'PUT':
+            return CaseResource.dispatch_request(self, *args, **kwargs)
+        # Served while the session is starting, or busy
+        _session_exists(self.sessions, kwargs.pop('session_id', None))
+        return super(CaseResource, self).dispatch_request(*args, **kwargs)
+
+    def get(self, job_id=None):
+        """GET request to receive the state of one or all queued scenarios."""
+        status = self.farm.status(job_id)
+        if status is None:
+            abort(404, message='Unknown scenario {}.'.format(job_id))
+        return status
+
+    def post(self):
+        """POST request with a list of fault scenarios to compile."""
+        scenarios = request.get_json(force=True)
+        if not isinstance(scenarios, list):
+            abort(400, message='Expected a list of fault scenarios.')
+        try:
+            ids = self.farm.submit(scenarios)
+        except ValueError as e:
+            abort(400, message=str(e))
+        return ids, 202
+
+    def put(self, job_id):
+        """PUT request to activate a compiled scenario."""
+        status = self.farm.status(job_id)
+        if status is None:
+            abort(404, message='Unknown scenario {}.'.format(job_id))
+        if status['state'] != 'ready':
+            abort(409, message='Scenario {} is {}.'.format(job_id, status['state']))
+        return self.run(self.case.set_scenario, dict(status['scenario']))
+
+class Sessions(Resource):
+    """Interface to create and list sessions."""
+
+    def __init__(self, **kwargs):
+            self.sessions = kwargs["sessions"]
+            self.jobs = kwargs["jobs"]
+
+    def get(self):
+        """GET request to receive the list of sessions."""
+        return self.sessions.list()
+
+    def post(self):
+        """
+        POST request with optional json data {<option>:<value>} to create 
+        a session with its own test case and receive its id.
+        """
+        options = request.get_json(silent=True) or {}
+        if _asynchronous():
+            job_id = self.jobs.submit(self.sessions.create, (options,))
+            return {'job_id': job_id}, 202, {'Location': '/jobs/{}'.format(job_id)}
+        try:
+            session_id = self.sessions.create(options)
+        except ValueError as e:
+            abort(400, message=str(e))
+        except RuntimeError as e:
+            abort(429, message=str(e))
+        return {'session_id': session_id}, 201
+
+class Session(Resource):
+    """Interface to a session."""
+
+    def __init__(self, **kwargs):
+            self.sessions = kwargs["sessions"]
+            self.runs = kwargs["runs"]
+
+    def delete(self, session_id):
+        """DELETE request to remove a session and its test case."""
+        if session_id == 'default':
+            abort(400, message='The default session cannot be deleted.')
+        run = self.runs.pop(session_id, None)
+        if run is not None:
+            run.stop()
+        if not self.sessions.delete(session_id):
+            abort(404, message='Unknown session {}.'.format(session_id))
+        return None
+
+class Jobs(Resource):
+    """Interface to the jobs of slow operations."""
+
+    def __init__(self, **kwargs):
+            self.jobs = kwargs["jobs"]
 
-class Results(Resource):
+    def get(self, job_id):
+        """
+        GET request to receive the state and result of a job, waiting up
+        to ``wait`` seconds for it to finish.
+        """
+        status = self.jobs.status(job_id, request.args.get('wait', type=float))
+        if status is None:
+            abort(404, message='Unknown job {}.'.format(job_id))
+        return status
+
+class Schedule(CaseResource):
+    """Interface to the input schedule of the test case."""
+
+    def __init__(self, **kwargs):
+            CaseResource.__init__(self, **kwargs)
+
+    def get(self):
+        """GET request to receive the input schedule, null if there is none."""
+        return self.case.get_schedule()
+
+    def put(self):
+        """
+        PUT request with a schedule as json data, or as a csv table with
+        the arguments ``interval``, ``start_time``, ``time_column``, 
+        ``interpolation`` and ``columns=<column>:<input_name>``, applied 
+        to the inputs that are not set by the client.
+        """
+        if request.mimetype == 'text/csv':
+            args = request.args
+            schedule = {'csv': request.get_data(as_text=True)}
+            for key in ('interval', 'start_time', 'time_column', 'interpolation'):
+                if key in args:
+                    schedule[key] = args[key]
+            if 'columns' in args:
+                schedule['columns'] = dict(value.split(':', 1) for values in args.getlist('columns')
+                                           for value in values.split(',') if ':' in value)
+        else:
+            schedule = request.get_json(silent=True)
+        try:
+            self.case.set_schedule(schedule)
+        except (TypeError, ValueError) as e:
+            abort(400, message=str(e))
+        return self.case.get_schedule()
+
+    def delete(self):
+        """DELETE request to remove the input schedule."""
+        self.case.set_schedule(None)
+        return None
+
+class Snapshot(CaseResource):
+    """Interface to save the state of the test case."""
+
+    def __init__(self, **kwargs):
+            CaseResource.__init__(self, **kwargs)
+
+    def get(self, snapshot_id=None):
+        """GET request to receive the snapshots and their simulation time."""
+        return self.case.get_snapshots()
+
+    def post(self, snapshot_id=None):
+        """
+        POST request to save the complete state of the test case and
+        receive the id of the snapshot.
+        """
+        try:
+            snapshot_id = self.case.snapshot()
+        except RuntimeError as e:
+            abort(409, message=str(e))
+        return {'snapshot_id': snapshot_id, 'time': self.case.get_snapshots()[snapshot_id]}, 201
+
+    def delete(self, snapshot_id=None):
+        """DELETE request to remove a snapshot."""
+        if not self.case.delete_snapshot(snapshot_id):
+            abort(404, message='Unknown snapshot {}.'.format(snapshot_id))
+        return None
+
+class Restore(CaseResource):
+    """Interface to restore a saved state of the test case."""
+
+    # Locked in put, after the snapshot of another session is read
+    locked = False
+    exclusive = True
+
+    def __init__(self, **kwargs):
+            CaseResource.__init__(self, **kwargs)
+
+    def put(self):
+        """
+        PUT request to restore a snapshot of the test case, or with 
+        ``session_id`` a snapshot of another session of the same model,
+        and receive the measurements of the restored state.
+        """
+        args = _body()
+        snapshot_id = args.get('snapshot_id')
+        source_id = args.get('session_id')
+        state = None
+        if source_id is not None and source_id != self.session_id:
+            lock = self.sessions.get_lock(source_id)
+            source = self.sessions.get(source_id)
+            if lock is None or source is None:
+                abort(404, message='Unknown session {}.'.format(source_id))
+            # Read with the lock of the other session only, two sessions
+            # restoring snapshots of each other would otherwise deadlock
+            with lock:
+                state = source.get_snapshot(snapshot_id)
+            if state is None:
+                abort(404, message='Unknown snapshot {}.'.format(snapshot_id))
+        with self.lock:
+            if self.running():
+                abort(409, message='Session {} is in a paced run, see DELETE run.'.format(self.session_id))
+            if state is None:
+                state = self.case.get_snapshot(snapshot_id)
+                if state is None:
+                    abort(404, message='Unknown snapshot {}.'.format(snapshot_id))
+            try:
+                return self.run(self.case.set_state, state)
+            except ValueError as e:
+                abort(409, message=str(e))
+
+class Metrics(Resource):
+    """Interface to the timing and solver metrics of the sessions."""
+
+    def __init__(self, **kwargs):
+            self.sessions = kwargs["sessions"]
+            self.metrics = kwargs["metrics"]
+
+    def get(self):
+        """
+        GET request to receive the histograms of all sessions in the 
+        Prometheus text format.
+        """
+        from metrics import render
+        snapshots = {}
+        for session_id in self.sessions.list():
+            case = self.sessions.get(session_id)
+            lock = self.sessions.get_lock(session_id)
+            if case is None or lock is None:
+                continue
+            # Sessions running a simulation report their last histograms
+            if lock.acquire(False):
+                try:
+                    self.metrics['cases'][session_id] = case.get_metrics()
+                finally:
+                    lock.release()
+            snapshot = dict(self.metrics['cases'].get(session_id, {}))
+            if session_id in self.metrics['web']:
+                snapshot.update(self.metrics['web'][session_id].snapshot())
+            snapshots[session_id] = snapshot
+        # Forget deleted sessions
+        for histograms in self.metrics.values():
+            for session_id in list(histograms.keys()):
+                if session_id not in snapshots:
+                    histograms.pop(session_id, None)
+        return Response(render(snapshots), mimetype='text/plain; version=0.0.4')
+
+class Run(CaseResource):
+    """Interface to the paced run of the test case."""
+
+    locked = False
+
+    def __init__(self, **kwargs):
+            CaseResource.__init__(self, **kwargs)
+            self.options = kwargs["options"]
+
+    def get(self):
+        """GET request to receive the state of the paced run."""
+        run = self.runs.get(self.session_id)
+        if run is None:
+            return {'state': 'stopped'}
+        return run.status()
+
+    def put(self):
+        """
+        PUT request with ``speed`` (simulated seconds per second, null to
+        run as fast as possible), ``end_time`` and ``inputs`` to start
+        advancing the simulation on the server, or to change the speed of
+        the running simulation.
+        """
+        from pacing import PacedRun
+        args = _body()
+        try:
+            speed = args.get('speed', 1.)
+            speed = None if speed is None else float(speed)
+            end_time = args.get('end_time')
+            end_time = None if end_time is None else float(end_time)
+            inputs = _input_schema(self.case, self.strict_inputs).parse(args.get('inputs'))
+            with self.lock:
+                run = self.running()
+                if run is not None:
+                    if 'speed' in args:
+                        run.set_speed(speed)
+                    if 'end_time' in args:
+                        run.end_time = end_time
+                    run.override(inputs)
+                    return run.status()
+                run = self.runs[self.session_id] = PacedRun(self.sessions, self.session_id, speed, end_time, inputs,
+                                                            **self.options)
+        except (SchemaError, TypeError, ValueError) as e:
+            abort(400, message=str(e))
+        run.start()
+        return run.status(), 201
+
+    def delete(self):
+        """DELETE request to stop the paced run at the end of its step."""
+        run = self.runs.get(self.session_id)
+        if run is None:
+            return {'state': 'stopped'}
+        run.stop()
+        return run.status()
+
+class RunInputs(CaseResource):
+    """Interface to the input overrides of the paced run."""
+
+    locked = False
+
+    def __init__(self, **kwargs):
+            CaseResource.__init__(self, **kwargs)
+
+    def get(self):
+        """GET request to receive the overridden inputs."""
+        run = self.runs.get(self.session_id)
+        return {} if run is None else run.status()['inputs']
+
+    def post(self):
+        """
+        POST request with {<input_name>:<value>} to override inputs from 
+        the next step boundary on, null releasing an override.
+        """
+        run = self.running()
+        if run is None:
+            abort(409, message='Session {} is not in a paced run.'.format(self.session_id))
+        args = _body()
+        if not hasattr(args, 'items'):
+            abort(400, message='Expected an object of input values.')
+        release = [name for name, value in args.items() if value is None]
+        schema = _input_schema(self.case, self.strict_inputs)
+        try:
+            values = schema.parse(dict((name, value) for name, value in args.items() if value is not None))
+        except SchemaError as e:
+            abort(400, message=str(e))
+        unknown = [name for name in release if name not in schema.index]
+        if unknown and schema.strict:
+            abort(400, message='Unknown input {}.'.format(unknown[0]))
+        return run.override(values, release)
+
+class RunMeasurements(CaseResource):
+    """Interface to the measurements published by the paced run."""
+
+    locked = False
+
+    def __init__(self, **kwargs):
+            CaseResource.__init__(self, **kwargs)
+
+    def get(self):
+        """
+        GET request to receive the measurements of every step of the paced
+        run as server-sent events, until the run ends.
+        """
+        run = self.running()
+        if run is None:
+            abort(409, message='Session {} is not in a paced run.'.format(self.session_id))
+        subscriber = run.subscribe()
+        def events():
+            try:
+                while True:
+                    try:
+                        y = subscriber.get(timeout=15)
+                    except Empty:
+                        # Detects clients that are gone
+                        yield ': keepalive\n\n'
+                        continue
+                    if y is None:
+                        yield 'event: end\ndata: {}\n\n'.format(json.dumps(run.status()))
+                        return
+                    yield 'data: {}\n\n'.format(json.dumps(y))
+            finally:
+                run.unsubscribe(subscriber)
+        return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+class Results(CaseResource):
     """Interface to test case result data."""
 
     def __init__(self, **kwargs):
-            self.case = kwargs["case"]
+            CaseResource.__init__(self, **kwargs)
 
     def get(self):
-        """GET request to receive measurement data."""
-        
-        Y = self.case.get_results()
+        """
+        GET request to receive measurement data, optionally restricted with
+        the query arguments ``start``, ``end``, ``signals``, ``cursor``, 
+        ``decimate`` and ``resample``.
+        """
+        args = request.args
+        signals = None
+        if 'signals' in args:
+            signals = [key for value in args.getlist('signals') for key in value.split(',') if key]
+        try:
+            Y = self.case.get_results(start=args.get('start', type=float),
+                                      end=args.get('end', type=float),
+                                      signals=signals,
+                                      cursor=args.get('cursor', type=int),
+                                      decimate=args.get('decimate', type=int),
+                                      resample=args.get('resample', type=float))
+        except ValueError as e:
+            abort(400, message=str(e))
         return Y
 
-class Inputs(Resource):
+class Export(CaseResource):
+    """Interface to export test case result data in a binary format."""
+
+    def __init__(self, **kwargs):
+            CaseResource.__init__(self, **kwargs)
+
+    def get(self):
+        """
+        GET request to receive measurement data as ``format=npz``, ``arrow`` 
+        or ``parquet``, optionally restricted with the query arguments 
+        ``start``, ``end`` and ``signals``.
+        """
+        from export import export, formats
+        args = request.args
+        fmt = args.get('format', 'npz')
+        signals = None
+        if 'signals' in args:
+            signals = [key for value in args.getlist('signals') for key in value.split(',') if key]
+        try:
+            table = self.case.get_result_arrays(start=args.get('start', type=float),
+                                                end=args.get('end', type=float),
+                                                signals=signals)
+            data = export(fmt, table['time'], table['columns'], table['metadata'])
+        except ValueError as e:
+            abort(400, message=str(e))
+        headers = {'Content-Disposition':'attachment; filename=results.{}'.format(fmt)}
+        return Response(data, mimetype=formats[fmt], headers=headers)
+
+class Inputs(CaseResource):
     """Interface to test case inputs."""
 
+    locked = False
+
     def __init__(self, **kwargs):
-            self.case = kwargs["case"]
+            CaseResource.__init__(self, **kwargs)
         
     def get(self):
         """GET request to receive list of available inputs."""
         u_list = self.case.get_inputs()
         return list(u_list)
                 
-class Measurements(Resource):
+class Measurements(CaseResource):
     """Interface to test case measurements."""
 
+    locked = False
+
     def __init__(self, **kwargs):
-            self.case = kwargs["case"]
+            CaseResource.__init__(self, **kwargs)
         
     def get(self):
         """GET request to receive list of available measurements."""
         y_list = self.case.get_measurements()
         return list(y_list)
 
-def main(config):
+def create_app(config):
+    """
+    Builds the application of a configuration, the model of the default
+    session is compiled in the background.
+    """
     
     # FLASK REQUIREMENTS
     # ------------------
@@ -151,10 +819,59 @@ def main(config):
 
     # INSTANTIATE TEST CASE
     # ---------------------
-    from testcase import TestCase
+    from sessions import SessionManager
     with open(config) as json_file:
         model_config = json.load(json_file)
-    case = TestCase(model_config)
+    pool = None
+    if 'worker_pool' in model_config:
+        from pool import WorkerPool
+        pool = WorkerPool(**model_config['worker_pool'])
+    sessions = SessionManager(model_config, model_config.get('max_sessions'), pool)
+    # Slow operations requested asynchronously
+    from jobs import JobManager
+    jobs = JobManager(**model_config.get('jobs', {}))
+    # The model of the default session is compiled in the background, so
+    # that the server answers right away
+    startup = jobs.submit(sessions.create, (None, 'default'), session_id='default')
+    # Fault information, available before the model is compiled
+    with open(model_config['model_info']) as f:
+        info = json.load(f)
+    # ---------------------
+
+    # ``scenario_farm`` interface
+    farm = None
+    if 'scenario_farm' in model_config:
+        from farm import ScenarioFarm
+        farm = ScenarioFarm(model_config, **model_config['scenario_farm'])
+    # ---------------------
+
+    # Paced runs of the sessions
+    runs = {}
+    # ---------------------
+
+    # Whether control inputs with unknown keys are rejected
+    strict_inputs = bool(model_config.get('strict_inputs', False))
+    # ---------------------
+
+    # Streaming channel for closed-loop control
+    if 'stream' in model_config:
+        from stream import StreamServer
+        StreamServer(sessions, runs=runs, **model_config['stream']).start()
+    # ---------------------
+
+    # Serialization time of the responses of each session
+    from metrics import Metrics as Histograms
+    metrics = {'web':{}, 'cases':{}}
+    def timed_json(data, code, headers=None):
+        tic = time.time()
+        response = output_json(data, code, headers)
+        session_id = getattr(g, 'session_id', None)
+        if session_id is not None:
+            if session_id not in metrics['web']:
+                metrics['web'][session_id] = Histograms()
+            metrics['web'][session_id].observe('step_phase_seconds', time.time()-tic, 'serialization')
+        return response
+    api.representations['application/json'] = timed_json
     # ---------------------
 
     # DEFINE ARGUMENT PARSERS
@@ -162,6 +879,7 @@ def main(config):
     # ``step`` interface
     parser_step = reqparse.RequestParser()
     parser_step.add_argument('step')
+    parser_step.add_argument('align')
     # ``fault_info`` interface
     parser_fault_info = reqparse.RequestParser()
     parser_fault_info.add_argument('fault')
@@ -169,31 +887,47 @@ def main(config):
     reset_step = reqparse.RequestParser()
     reset_step.add_argument('start_time')
     reset_step.add_argument('end_time')
-    # ``advance`` interface
-    parser_advance = reqparse.RequestParser()
-    for key in case.u.keys():
-        parser_advance.add_argument(key)
-
     # ``fault_scenario`` interface
-    parser_fault_scenario = reqparse.RequestParser()
-    for key in case.info.keys():
-        parser_fault_scenario.add_argument(key)
+    schema_fault_scenario = ScenarioSchema(info)
 
     # --------------------------------------
     # ADD REQUESTS TO API WITH URL EXTENSION
     # --------------------------------------
-    api.add_resource(Advance, '/advance', resource_class_kwargs = {"case": case, "parser_advance": parser_advance})
-    api.add_resource(Reset, '/reset', resource_class_kwargs = {"case": case, "parser_reset": reset_step, "config":config})
-    api.add_resource(Step, '/step', resource_class_kwargs = {"case": case, "parser_step": parser_step})
-    api.add_resource(Results, '/results', resource_class_kwargs = {"case": case})
-    api.add_resource(Inputs, '/inputs', resource_class_kwargs = {"case": case})
-    api.add_resource(Measurements, '/measurements', resource_class_kwargs = {"case": case})
-    api.add_resource(Faults, '/faults', resource_class_kwargs = {"case": case})
-    api.add_resource(Info, '/fault_info', resource_class_kwargs = {"case": case, "parser_fault_info": parser_fault_info})
-    api.add_resource(Scenario, '/fault_scenario', resource_class_kwargs = {"case": case, "parser_fault_scenario": parser_fault_scenario})
+    api.add_resource(Sessions, '/sessions', resource_class_kwargs = {"sessions": sessions, "jobs": jobs})
+    api.add_resource(Ready, '/ready', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "startup": startup})
+    api.add_resource(Metrics, '/metrics', resource_class_kwargs = {"sessions": sessions, "metrics": metrics})
+    api.add_resource(Jobs, '/jobs/<job_id>', resource_class_kwargs = {"jobs": jobs})
+    api.add_resource(Session, '/sessions/<session_id>', resource_class_kwargs = {"sessions": sessions, "runs": runs})
+    api.add_resource(Advance, '/advance', '/sessions/<session_id>/advance', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs, "strict_inputs": strict_inputs})
+    api.add_resource(AdvanceBatch, '/advance_batch', '/sessions/<session_id>/advance_batch', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs})
+    api.add_resource(Reset, '/reset', '/sessions/<session_id>/reset', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs, "parser_reset": reset_step, "config":config})
+    api.add_resource(Step, '/step', '/sessions/<session_id>/step', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs, "parser_step": parser_step})
+    api.add_resource(Events, '/events', '/sessions/<session_id>/events', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs})
+    api.add_resource(Schedule, '/schedule', '/sessions/<session_id>/schedule', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs})
+    api.add_resource(Snapshot, '/snapshot', '/snapshot/<snapshot_id>', '/sessions/<session_id>/snapshot', '/sessions/<session_id>/snapshot/<snapshot_id>', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs})
+    api.add_resource(Restore, '/restore', '/sessions/<session_id>/restore', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs})
+    api.add_resource(Run, '/run', '/sessions/<session_id>/run', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs, "strict_inputs": strict_inputs, "options": model_config.get('paced_run', {})})
+    api.add_resource(RunInputs, '/run/inputs', '/sessions/<session_id>/run/inputs', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs, "strict_inputs": strict_inputs})
+    api.add_resource(RunMeasurements, '/run/measurements', '/sessions/<session_id>/run/measurements', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs})
+    api.add_resource(Results, '/results', '/sessions/<session_id>/results', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs})
+    api.add_resource(Export, '/results/export', '/sessions/<session_id>/results/export', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs})
+    api.add_resource(Inputs, '/inputs', '/sessions/<session_id>/inputs', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs})
+    api.add_resource(Measurements, '/measurements', '/sessions/<session_id>/measurements', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs})
+    api.add_resource(Subscription, '/measurements/subscription', '/sessions/<session_id>/measurements/subscription', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs})
+    api.add_resource(MeasurementValues, '/measurements/values', '/sessions/<session_id>/measurements/values', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs})
+    api.add_resource(Faults, '/faults', '/sessions/<session_id>/faults', resource_class_kwargs = {"info": info, "sessions": sessions})
+    api.add_resource(Info, '/fault_info', '/sessions/<session_id>/fault_info', resource_class_kwargs = {"info": info, "sessions": sessions, "parser_fault_info": parser_fault_info})
+    api.add_resource(Scenario, '/fault_scenario', '/sessions/<session_id>/fault_scenario', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs, "schema_fault_scenario": schema_fault_scenario})
+    if farm is not None:
+        api.add_resource(Farm, '/scenario_farm', '/scenario_farm/<job_id>', '/sessions/<session_id>/scenario_farm', '/sessions/<session_id>/scenario_farm/<job_id>', resource_class_kwargs = {"sessions": sessions, "jobs": jobs, "runs": runs, "farm": farm})
     # --------------------------------------
 
-    app.run(debug=False, host='0.0.0.0')        
+    return app
+
+def main(config):
+
+    app = create_app(config)
+    app.run(debug=False, host='0.0.0.0', threaded=True)        
 
     # --------------------------------------
 
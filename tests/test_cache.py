@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the file caches of the fmus and warmup states, see
+``model/cache.py``.
+
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
+from cache import FileCache, cache_key, library_version
+
+
+class FileCacheTest(unittest.TestCase):
+    '''Tests the storage and eviction of cache entries.'''
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def put(self, cache, key, age, size=10):
+        '''Stores an entry last used ``age`` seconds ago.'''
+
+        path = cache.put_bytes(key, b'x'*size)
+        used = os.path.getmtime(path) - age
+        os.utime(path, (used, used))
+
+    def keys(self, cache):
+        return sorted(name[:-len(cache.suffix)] for name in os.listdir(self.path))
+
+    def test_get(self):
+        cache = FileCache(self.path, suffix='.state')
+        self.assertIsNone(cache.get('a'))
+        cache.put_bytes('a', b'data')
+        self.assertEqual(cache.get_bytes('a'), b'data')
+        self.assertEqual(cache.get('a'), os.path.join(self.path, 'a.state'))
+
+    def test_max_entries(self):
+        cache = FileCache(self.path, suffix='.fmu', max_entries=2)
+        self.put(cache, 'a', 30)
+        self.put(cache, 'b', 20)
+        # Used last, so b is the least recently used entry
+        cache.get('a')
+        self.put(cache, 'c', 0)
+        self.assertEqual(self.keys(cache), ['a', 'c'])
+
+    def test_max_size(self):
+        cache = FileCache(self.path, suffix='.fmu', max_size=25)
+        self.put(cache, 'a', 30)
+        self.put(cache, 'b', 20)
+        self.put(cache, 'c', 0)
+        self.assertEqual(self.keys(cache), ['b', 'c'])
+        # An entry above the limit is kept itself
+        cache.put_bytes('d', b'x'*50)
+        self.assertEqual(self.keys(cache), ['d'])
+
+    def test_cache_key(self):
+        self.assertEqual(cache_key('model', {'a':1, 'b':2}), cache_key('model', {'b':2, 'a':1}))
+        self.assertNotEqual(cache_key('model', 1), cache_key('model', 2))
+
+    def test_library_version(self):
+        with open(os.path.join(self.path, 'package.mo'), 'w') as f:
+            f.write('package P end P;')
+        version = library_version([self.path])
+        # Only Modelica files are part of the fingerprint
+        with open(os.path.join(self.path, 'notes.txt'), 'w') as f:
+            f.write('notes')
+        self.assertEqual(library_version([self.path]), version)
+        with open(os.path.join(self.path, 'package.mo'), 'a') as f:
+            f.write('\n')
+        self.assertNotEqual(library_version([self.path]), version)
+
+
+if __name__ == '__main__':
+    unittest.main()
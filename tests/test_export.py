@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the export of the stored results, see
+``model/export.py``. The Arrow and Parquet tests require pyarrow.
+
+"""
+
+import io
+import os
+import sys
+import json
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
+from export import export, signal_metadata, pa
+
+info = {'zon1_set':{'path':'zon1.set', 'description':'Zone setpoint', 'type':'key point'},
+        'zon1_temp':{'path':'zon1.T', 'description':'Zone temperature', 'type':'output'}}
+
+
+class ExportTest(unittest.TestCase):
+    '''Tests the serialization of result trajectories.'''
+
+    def setUp(self):
+        self.time = np.arange(5, dtype=float)
+        self.columns = [('zon1_temp', 290. + self.time), ('zon1_set_u', np.full(5, np.nan))]
+        self.metadata = signal_metadata([name for name, values in self.columns], info)
+
+    def serialize(self, fmt, **kwargs):
+        return b''.join(export(fmt, self.time, self.columns, self.metadata, **kwargs))
+
+    def test_signal_metadata(self):
+        metadata = signal_metadata(['zon1_temp', 'zon1_set_u', 'zon1_set_activate', 'other'], info)
+        self.assertEqual(metadata['zon1_temp']['path'], 'zon1.T')
+        # Control inputs are described by the key point they overwrite
+        self.assertEqual(metadata['zon1_set_u'], info['zon1_set'])
+        self.assertEqual(metadata['zon1_set_activate'], info['zon1_set'])
+        self.assertEqual(metadata['other'], {})
+
+    def test_npz(self):
+        archive = np.load(io.BytesIO(self.serialize('npz')))
+        np.testing.assert_array_equal(archive['time'], self.time)
+        np.testing.assert_array_equal(archive['zon1_temp'], self.columns[0][1])
+        self.assertTrue(np.all(np.isnan(archive['zon1_set_u'])))
+        self.assertEqual(json.loads(str(archive['metadata'])), self.metadata)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            export('csv', self.time, self.columns, self.metadata)
+
+    @unittest.skipIf(pa is None, 'pyarrow is not installed')
+    def test_arrow(self):
+        # Several record batches
+        table = pa.ipc.open_stream(self.serialize('arrow', chunk=2)).read_all()
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(table.schema.names, ['time', 'zon1_temp', 'zon1_set_u'])
+        np.testing.assert_array_equal(table.column('zon1_temp').to_pylist(), self.columns[0][1])
+        self.assertEqual(json.loads(table.schema.metadata[b'signals'].decode('utf-8')), self.metadata)
+
+    @unittest.skipIf(pa is None, 'pyarrow is not installed')
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+        table = pq.read_table(pa.BufferReader(self.serialize('parquet', chunk=2)))
+        self.assertEqual(table.num_rows, 5)
+        np.testing.assert_array_equal(table.column('time').to_pylist(), self.time)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the jobs of the simulation server, see ``model/jobs.py``.
+
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
+from jobs import JobManager
+
+
+class JobManagerTest(unittest.TestCase):
+    '''Tests running and polling jobs.'''
+
+    def setUp(self):
+        self.jobs = JobManager(workers=2, history=3)
+
+    def test_done(self):
+        job_id = self.jobs.submit(lambda a, b: a + b, (1, 2), session_id='s')
+        status = self.jobs.status(job_id, wait=5)
+        self.assertEqual(status['state'], 'done')
+        self.assertEqual(status['result'], 3)
+        self.assertEqual(status['session_id'], 's')
+
+    def test_failed(self):
+        def fail():
+            raise ValueError('boom')
+        status = self.jobs.status(self.jobs.submit(fail), wait=5)
+        self.assertEqual(status['state'], 'failed')
+        self.assertEqual(status['error'], 'boom')
+
+    def test_unknown(self):
+        self.assertIsNone(self.jobs.status('unknown'))
+
+    def test_wait(self):
+        release = threading.Event()
+        job_id = self.jobs.submit(release.wait, (5,))
+        self.assertIn(self.jobs.status(job_id, wait=0.05)['state'], ('queued', 'running'))
+        release.set()
+        self.assertEqual(self.jobs.status(job_id, wait=5)['state'], 'done')
+
+    def test_lock(self):
+        lock = threading.Lock()
+        lock.acquire()
+        job_id = self.jobs.submit(lambda: 1, lock=lock)
+        # Not run while the lock is held
+        self.assertEqual(self.jobs.status(job_id, wait=0.05)['state'], 'queued')
+        lock.release()
+        self.assertEqual(self.jobs.status(job_id, wait=5)['state'], 'done')
+
+    def test_result_copy(self):
+        y = {'time':0}
+        job_id = self.jobs.submit(lambda: y)
+        self.jobs.status(job_id, wait=5)
+        # The result does not change with the object returned by the function
+        y['time'] = 60
+        self.assertEqual(self.jobs.status(job_id)['result'], {'time':0})
+
+    def test_history(self):
+        ids = [self.jobs.submit(lambda i: i, (i,)) for i in range(5)]
+        for job_id in ids:
+            self.jobs.status(job_id, wait=5)
+        statuses = [self.jobs.status(job_id) for job_id in ids]
+        # Only the most recent finished jobs are kept
+        self.assertEqual(sum(status is not None for status in statuses), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
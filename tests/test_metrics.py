@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the histograms of the simulation steps and their
+Prometheus rendering, see ``model/metrics.py``.
+
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
+from metrics import Metrics, render, solver_statistics
+
+
+class MetricsTest(unittest.TestCase):
+    '''Tests the collection and rendering of histograms.'''
+
+    def test_observe(self):
+        metrics = Metrics()
+        metrics.observe('step_phase_seconds', 0.003, 'solver')
+        metrics.observe('step_phase_seconds', 1000., 'solver')
+        counts, total, count = metrics.snapshot()[('step_phase_seconds', 'solver')]
+        self.assertEqual(count, 2)
+        self.assertEqual(total, 1000.003)
+        # In the bucket of 0.005 s and above the largest bucket
+        self.assertEqual(counts[5], 1)
+        self.assertEqual(counts[-1], 1)
+
+    def test_solver_statistics(self):
+        metrics = Metrics()
+        solver_statistics(metrics, {'nsteps':10, 'nfcns':30, 'nstateevents':1, 'ntimeevents':2})
+        histograms = metrics.snapshot()
+        self.assertEqual(histograms[('solver_steps', None)][1], 10)
+        self.assertEqual(histograms[('solver_events', None)][1], 3)
+
+    def test_render(self):
+        metrics = Metrics()
+        metrics.observe('step_phase_seconds', 0.003, 'solver')
+        metrics.observe('step_phase_seconds', 0.2, 'solver')
+        metrics.observe('solver_steps', 4)
+        lines = render({'default':metrics.snapshot()}).splitlines()
+        self.assertIn('# TYPE bct_step_phase_seconds histogram', lines)
+        self.assertIn('bct_step_phase_seconds_bucket{session="default",phase="solver",le="0.001"} 0', lines)
+        self.assertIn('bct_step_phase_seconds_bucket{session="default",phase="solver",le="0.005"} 1', lines)
+        self.assertIn('bct_step_phase_seconds_bucket{session="default",phase="solver",le="0.25"} 2', lines)
+        self.assertIn('bct_step_phase_seconds_bucket{session="default",phase="solver",le="+Inf"} 2', lines)
+        self.assertIn('bct_step_phase_seconds_count{session="default",phase="solver"} 2', lines)
+        self.assertIn('bct_solver_steps_bucket{session="default",le="5"} 1', lines)
+        self.assertIn('bct_solver_steps_sum{session="default"} 4.0', lines)
+
+    def test_render_empty(self):
+        text = render({})
+        self.assertTrue(text.endswith('\n'))
+        self.assertNotIn('_bucket', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the paced run mode of the simulation server, see
+``model/pacing.py``, with a stand-in for the test case.
+
+"""
+
+import os
+import sys
+import time
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
+from pacing import PacedRun
+
+
+class Case(object):
+    '''Test case with steps of 60 s that returns its inputs.'''
+
+    def __init__(self, fail_at=None):
+        self.time = 0.
+        self.inputs = []
+        self.fail_at = fail_at
+
+    def advance(self, u):
+        if self.time == self.fail_at:
+            raise RuntimeError('boom')
+        self.inputs.append(u)
+        self.time += 60
+        y = {'time':self.time}
+        y.update(u)
+        return y
+
+
+class Sessions(object):
+    '''Sessions of one test case.'''
+
+    def __init__(self, case):
+        self.case = case
+        self.lock = threading.Lock()
+
+    def get(self, session_id):
+        return self.case
+
+    def get_lock(self, session_id):
+        return self.lock
+
+
+def wait(run, timeout=5):
+    '''Waits for the end of a run and returns its status.'''
+
+    run.thread.join(timeout)
+
+    return run.status()
+
+
+class PacedRunTest(unittest.TestCase):
+    '''Tests advancing a test case in the background.'''
+
+    def test_finished(self):
+        case = Case()
+        run = PacedRun(Sessions(case), 'default', speed=None, end_time=300, inputs={'a':1})
+        subscriber = run.subscribe()
+        run.start()
+        status = wait(run)
+        self.assertEqual(status['state'], 'finished')
+        self.assertEqual(status['steps'], 5)
+        self.assertEqual(status['measurements'], {'time':300., 'a':1})
+        published = []
+        while True:
+            y = subscriber.get(timeout=1)
+            if y is None:
+                break
+            published.append(y['time'])
+        self.assertEqual(published, [60., 120., 180., 240., 300.])
+        # Subscribers of a finished run get the end right away
+        self.assertIsNone(run.subscribe().get(timeout=1))
+
+    def test_pace(self):
+        run = PacedRun(Sessions(Case()), 'default', speed=600, end_time=240)
+        tic = time.time()
+        run.start()
+        self.assertEqual(wait(run)['state'], 'finished')
+        # The last step starts 120 s after the first at 600 times real time
+        self.assertGreaterEqual(time.time() - tic, 0.19)
+
+    def test_override(self):
+        case = Case()
+        run = PacedRun(Sessions(case), 'default', speed=120, inputs={'a':1, 'b':2})
+        subscriber = run.subscribe()
+        run.start()
+        # The pace is measured from the end of the first step
+        self.assertEqual(subscriber.get(timeout=1), {'time':60., 'a':1, 'b':2})
+        self.assertEqual(subscriber.get(timeout=1), {'time':120., 'a':1, 'b':2})
+        self.assertEqual(run.override({'a':3}, release=['b']), {'a':3})
+        # Applied from the next step on
+        self.assertEqual(subscriber.get(timeout=2), {'time':180., 'a':3})
+        run.stop()
+        self.assertEqual(run.status()['state'], 'stopped')
+
+    def test_failed(self):
+        run = PacedRun(Sessions(Case(fail_at=120)), 'default', speed=None)
+        run.start()
+        status = wait(run)
+        self.assertEqual(status['state'], 'failed')
+        self.assertEqual(status['error'], 'RuntimeError: boom')
+        self.assertEqual(status['steps'], 2)
+
+    def test_session_replaced(self):
+        sessions = Sessions(Case())
+        run = PacedRun(sessions, 'default', speed=None)
+        sessions.case = Case()
+        run.start()
+        self.assertEqual(wait(run)['state'], 'stopped')
+        self.assertEqual(run.status()['steps'], 0)
+
+    def test_speed(self):
+        run = PacedRun(Sessions(Case()), 'default', speed=0)
+        self.assertIsNone(run.status()['speed'])
+        with self.assertRaises(ValueError):
+            run.set_speed(-1)
+
+
+if __name__ == '__main__':
+    unittest.main()
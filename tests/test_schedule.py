@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the input schedules of the test case, see
+``model/schedule.py``.
+
+"""
+
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
+from schedule import InputSchedule, read_csv
+
+
+class InputScheduleTest(unittest.TestCase):
+    '''Tests the evaluation of input schedules.'''
+
+    def test_hold(self):
+        schedule = InputSchedule({'time':[0, 10, 20], 'values':{'u':[1, 2, 3]}})
+        values = schedule.at(np.array([0, 5, 10, 15, 25]))
+        np.testing.assert_array_equal(values['u'], [1, 1, 2, 2, 3])
+        self.assertEqual(schedule.at(12)['u'], 2)
+
+    def test_linear(self):
+        schedule = InputSchedule({'time':[0, 10], 'values':{'u':[0, 10]}, 'interpolation':'linear'})
+        np.testing.assert_allclose(schedule.at(np.array([0, 2.5, 10, 20]))['u'], [0, 2.5, 10, 10])
+
+    def test_before_first_sample(self):
+        for interpolation in ('previous', 'linear'):
+            schedule = InputSchedule({'time':[10, 20], 'values':{'u':[1, 2]},
+                                      'interpolation':interpolation})
+            self.assertTrue(np.isnan(schedule.at(5)['u']))
+            self.assertEqual(schedule.at(10)['u'], 1)
+
+    def test_nan_gaps(self):
+        schedule = InputSchedule({'time':[0, 10, 20], 'values':{'u':[1, None, 3]}})
+        values = schedule.at(np.array([5, 15, 25]))['u']
+        self.assertEqual(values[0], 1)
+        self.assertTrue(np.isnan(values[1]))
+        self.assertEqual(values[2], 3)
+        # Linear interpolation does not interpolate towards unset samples
+        schedule = InputSchedule({'time':[0, 10, 20], 'values':{'u':[1, None, 3]},
+                                  'interpolation':'linear'})
+        values = schedule.at(np.array([5, 15]))['u']
+        self.assertEqual(values[0], 1)
+        self.assertTrue(np.isnan(values[1]))
+
+    def test_interval(self):
+        schedule = InputSchedule({'interval':60, 'start_time':120, 'values':{'u':[1, 2]}})
+        np.testing.assert_array_equal(schedule.times, [120, 180])
+
+    def test_change_times(self):
+        schedule = InputSchedule({'time':[0, 10, 20, 30], 'values':{'u':[1, 1, 2, 2]}})
+        self.assertEqual(schedule.change_times(), [0., 20.])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            InputSchedule({'time':[0, 10], 'values':{'u':[1]}})
+        with self.assertRaises(ValueError):
+            InputSchedule({'time':[10, 0], 'values':{'u':[1, 2]}})
+        with self.assertRaises(ValueError):
+            InputSchedule({'time':[0], 'values':{'x':[1]}}, names=['u'])
+        with self.assertRaises(ValueError):
+            InputSchedule({'time':[0], 'values':{'u':[1]}, 'interpolation':'cubic'})
+
+
+class ReadCsvTest(unittest.TestCase):
+    '''Tests the reading of schedules from csv tables.'''
+
+    text = u'\ufefftime,a,b\n0,1,2\n60,,4\n'
+
+    def test_columns(self):
+        values, times = read_csv(self.text, time_column='time')
+        self.assertEqual(times, [0., 60.])
+        self.assertEqual(values, {'a':[1., None], 'b':[2., 4.]})
+
+    def test_column_mapping(self):
+        values, times = read_csv(self.text, columns={'b':'u'}, time_column='time')
+        self.assertEqual(values, {'u':[2., 4.]})
+
+    def test_without_time(self):
+        values, times = read_csv('a\n1\n2\n')
+        self.assertIsNone(times)
+        self.assertEqual(values, {'a':[1., 2.]})
+
+    def test_unknown_column(self):
+        with self.assertRaises(ValueError):
+            read_csv(self.text, columns={'c':'u'})
+        with self.assertRaises(ValueError):
+            read_csv('a\nx\n')
+
+    def test_schedule(self):
+        schedule = InputSchedule({'csv':self.text, 'columns':{'a':'u'}, 'time_column':'time'})
+        self.assertEqual(schedule.at(30)['u'], 1)
+        self.assertTrue(np.isnan(schedule.at(60)['u']))
+
+
+if __name__ == '__main__':
+    unittest.main()
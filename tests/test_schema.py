@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the request schemas of the simulation server, see
+``model/schema.py``.
+
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
+from schema import InputSchema, ScenarioSchema, SchemaError
+
+
+class InputSchemaTest(unittest.TestCase):
+    '''Tests the conversion of control inputs.'''
+
+    def setUp(self):
+        self.schema = InputSchema(['a', 'b', 'c'])
+
+    def test_dict(self):
+        self.assertEqual(self.schema.parse({'a':'1.5', 'b':None, 'c':''}), {'a':1.5})
+        self.assertEqual(self.schema.parse(None), {})
+
+    def test_list(self):
+        self.assertEqual(self.schema.parse([1, None, 3]), {'a':1., 'c':3.})
+        self.assertEqual(self.schema.parse([2]), {'a':2.})
+        with self.assertRaises(SchemaError):
+            self.schema.parse([1, 2, 3, 4])
+
+    def test_unknown_keys(self):
+        self.assertEqual(self.schema.parse({'time':0, 'a':1, 'x':2}), {'a':1.})
+        with self.assertRaises(SchemaError):
+            InputSchema(['a'], strict=True).parse({'time':0, 'a':1})
+
+    def test_invalid(self):
+        with self.assertRaises(SchemaError):
+            self.schema.parse({'a':'high'})
+        with self.assertRaises(SchemaError):
+            self.schema.parse('a')
+
+
+class ScenarioSchemaTest(unittest.TestCase):
+    '''Tests the conversion of fault scenarios.'''
+
+    def setUp(self):
+        self.schema = ScenarioSchema({'temp':{'type':'key point'},
+                                      'sensor':{'type':'output'}})
+
+    def test_parse(self):
+        scenario = self.schema.parse({'temp':"{'value': 2, 'fault_time': 60}",
+                                      'sensor':{'name':'zon1'}})
+        self.assertEqual(scenario, {'temp':{'value':2., 'fault_time':60.},
+                                    'sensor':{'name':'zon1'}})
+
+    def test_invalid(self):
+        with self.assertRaises(SchemaError):
+            self.schema.parse({'unknown':{'value':1, 'fault_time':0}})
+        with self.assertRaises(SchemaError):
+            self.schema.parse({'temp':{'value':1}})
+        with self.assertRaises(SchemaError):
+            self.schema.parse({'temp':{'value':1, 'fault_time':0, 'extra':1}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the columnar storage of the simulation results, see
+``model/store.py``.
+
+"""
+
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
+from store import ColumnStore
+
+
+def samples(start, stop):
+    '''Returns samples with times start to stop and columns a = t, b = 2t.'''
+
+    time = np.arange(start, stop, dtype=float)
+
+    return time, np.column_stack([time, 2*time])
+
+
+class ColumnStoreTest(unittest.TestCase):
+    '''Tests the storage of results.'''
+
+    def test_growth(self):
+        store = ColumnStore(['a', 'b'], chunk=4)
+        for i in range(5):
+            store.append(*samples(3*i, 3*i + 3))
+        time, data = store.arrays()
+        np.testing.assert_array_equal(time, np.arange(15))
+        np.testing.assert_array_equal(data[:, 1], 2*np.arange(15))
+        self.assertEqual(len(store), 15)
+        self.assertEqual(store.first(), 0)
+
+    def test_capacity(self):
+        store = ColumnStore(['a', 'b'], capacity=5)
+        store.append(*samples(0, 3))
+        store.append(*samples(3, 7))
+        time, data = store.arrays()
+        np.testing.assert_array_equal(time, [2, 3, 4, 5, 6])
+        np.testing.assert_array_equal(data[:, 0], time)
+        self.assertEqual(len(store), 5)
+        self.assertEqual(store.first(), 2)
+        # More samples than the capacity at once
+        store.append(*samples(7, 20))
+        np.testing.assert_array_equal(store.arrays()[0], np.arange(15, 20))
+
+    def test_partial_columns(self):
+        store = ColumnStore(['a', 'b'])
+        store.append([0., 1.], [[1.], [2.]], names=['b'])
+        data = store.arrays()[1]
+        self.assertTrue(np.all(np.isnan(data[:, 0])))
+        np.testing.assert_array_equal(data[:, 1], [1, 2])
+
+
+class ColumnStoreQueryTest(unittest.TestCase):
+    '''Tests the windowed queries of results.'''
+
+    def test_query_wrapped(self):
+        store = ColumnStore(['a', 'b'], capacity=5)
+        store.append(*samples(0, 8))
+        time, data, cursor = store.query(start=4, end=6, names=['b'])
+        np.testing.assert_array_equal(time, [4, 5, 6])
+        np.testing.assert_array_equal(data[:, 0], [8, 10, 12])
+        self.assertEqual(cursor, 7)
+
+    def test_cursor(self):
+        store = ColumnStore(['a', 'b'])
+        store.append(*samples(0, 5))
+        time, data, cursor = store.query()
+        store.append(*samples(5, 7))
+        time, data, cursor = store.query(cursor=cursor)
+        np.testing.assert_array_equal(time, [5, 6])
+        self.assertEqual(cursor, 7)
+
+    def test_decimate(self):
+        store = ColumnStore(['a', 'b'])
+        store.append(*samples(0, 10))
+        time, data, cursor = store.query(decimate=3)
+        np.testing.assert_array_equal(time, [0, 3, 6, 9])
+        np.testing.assert_array_equal(data[:, 1], [0, 6, 12, 18])
+        self.assertEqual(cursor, 10)
+
+    def test_resample(self):
+        store = ColumnStore(['a', 'b'])
+        store.append(*samples(0, 5))
+        time, data, cursor = store.query(resample=0.5, names=['a'])
+        np.testing.assert_allclose(time, np.arange(0, 4.5, 0.5))
+        np.testing.assert_allclose(data[:, 0], time)
+
+    def test_cursor_dropped(self):
+        store = ColumnStore(['a', 'b'], capacity=5)
+        store.append(*samples(0, 8))
+        # Samples dropped by the ring buffer are skipped
+        time, data, cursor = store.query(cursor=1)
+        np.testing.assert_array_equal(time, [3, 4, 5, 6, 7])
+        self.assertEqual(cursor, 8)
+
+    def test_empty_window(self):
+        store = ColumnStore(['a', 'b'])
+        store.append(*samples(0, 5))
+        time, data, cursor = store.query(start=10, resample=1.)
+        self.assertEqual(len(time), 0)
+        self.assertEqual(data.shape, (0, 2))
+        self.assertEqual(cursor, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
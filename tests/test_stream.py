@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the streaming channel for closed-loop control, see
+``model/stream.py``, with a stand-in for the test case.
+
+"""
+
+import os
+import sys
+import json
+import math
+import socket
+import struct
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
+from stream import StreamServer, read_frame, write_frame
+
+
+class Case(object):
+    '''Test case that adds the inputs to its time at every step.'''
+
+    def __init__(self):
+        self.time = 0.
+        self.inputs = []
+
+    def get_inputs(self):
+        return ['a', 'b']
+
+    def get_measurements(self):
+        return ['y', 'z']
+
+    def get_step(self):
+        return 60
+
+    def advance(self, u):
+        self.inputs.append(u)
+        self.time += 60
+        # z is not subscribed
+        return {'time':self.time, 'y':sum(u.values())}
+
+
+class Sessions(object):
+    '''Sessions of one test case.'''
+
+    def __init__(self, case):
+        self.case = case
+        self.lock = threading.Lock()
+
+    def get(self, session_id):
+        return self.case if session_id == 'default' else None
+
+    def get_lock(self, session_id):
+        return self.lock if session_id == 'default' else None
+
+
+class Run(object):
+    '''Paced run in a given state.'''
+
+    def __init__(self, state):
+        self.state = state
+
+    def status(self):
+        return {'state':self.state}
+
+
+class FrameTest(unittest.TestCase):
+    '''Tests the framing of the channel.'''
+
+    def test_frames(self):
+        a, b = socket.socketpair()
+        try:
+            write_frame(a, b'hello')
+            write_frame(a, b'')
+            self.assertEqual(read_frame(b), b'hello')
+            self.assertEqual(read_frame(b), b'')
+            # Closed connection, also within a frame
+            a.sendall(struct.pack('!I', 10) + b'abc')
+            a.close()
+            self.assertIsNone(read_frame(b))
+            self.assertIsNone(read_frame(b))
+        finally:
+            b.close()
+
+
+class StreamServerTest(unittest.TestCase):
+    '''Tests advancing a test case through the channel.'''
+
+    def setUp(self):
+        self.case = Case()
+        self.runs = {}
+        self.server = StreamServer(Sessions(self.case), host='127.0.0.1', port=0, runs=self.runs)
+        self.server.start()
+        self.sock = socket.create_connection(self.server.server.server_address)
+
+    def tearDown(self):
+        self.sock.close()
+        self.server.stop()
+
+    def hello(self, session=None):
+        write_frame(self.sock, json.dumps(session).encode('utf-8') if session else b'')
+        return json.loads(read_frame(self.sock).decode('utf-8'))
+
+    def step(self, pairs=()):
+        write_frame(self.sock, b''.join(struct.pack('!Hd', i, v) for i, v in pairs))
+        return read_frame(self.sock)
+
+    def test_advance(self):
+        self.assertEqual(self.hello(), {'inputs':['a', 'b'], 'measurements':['y', 'z'], 'step':60})
+        status, time, y, z = struct.unpack('!Bddd', self.step([(1, 2.5), (0, 1.)]))
+        self.assertEqual((status, time, y), (0, 60., 3.5))
+        self.assertTrue(math.isnan(z))
+        self.assertEqual(self.case.inputs, [{'a':1., 'b':2.5}])
+        # Default inputs
+        self.assertEqual(struct.unpack('!Bddd', self.step())[:3], (0, 120., 0.))
+
+    def test_errors(self):
+        self.hello({'session_id':'default'})
+        frame = self.step([(2, 1.)])
+        self.assertEqual(frame[:1], b'\x01')
+        self.assertIn(b'Unknown input id 2', frame)
+        write_frame(self.sock, b'abc')
+        self.assertEqual(read_frame(self.sock)[:1], b'\x01')
+        self.runs['default'] = Run('running')
+        self.assertIn(b'paced run', self.step())
+        self.runs['default'] = Run('stopped')
+        self.assertEqual(self.step()[:1], b'\x00')
+        self.assertEqual(len(self.case.inputs), 1)
+
+    def test_unknown_session(self):
+        self.assertEqual(self.hello({'session_id':'other'}), {'error':'Unknown session other.'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the listing of the runs of a scenario sweep, see
+``model/sweep.py``.
+
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
+from sweep import runs, scenario
+
+info = {'zon1_temp':{'type':'sensor'},
+        'zon2_temp':{'type':'sensor'},
+        'fan_eff':{'type':'efficiency'},
+        'zon1_set':{'type':'input'},
+        'zon1_out':{'type':'output'}}
+
+
+class RunsTest(unittest.TestCase):
+    '''Tests the combinations of a sweep.'''
+
+    def test_all_faults(self):
+        listed = runs({'values':[1, 2], 'fault_times':[0, 60]}, info)
+        # Baseline and 3 faults of 2 values at 2 times
+        self.assertEqual(len(listed), 13)
+        self.assertEqual(listed[0], {'run':'run00', 'fault':None, 'value':None, 'fault_time':None})
+        self.assertEqual(listed[1], {'run':'run01', 'fault':'fan_eff', 'value':1, 'fault_time':0})
+        self.assertEqual(listed[2]['fault_time'], 60)
+        self.assertEqual(listed[-1]['run'], 'run12')
+        self.assertNotIn('zon1_set', [run['fault'] for run in listed])
+
+    def test_fault_type(self):
+        listed = runs({'faults':'sensor', 'values':[1], 'fault_times':[0], 'baseline':False}, info)
+        self.assertEqual([run['fault'] for run in listed], ['zon1_temp', 'zon2_temp'])
+        self.assertEqual([run['run'] for run in listed], ['run0', 'run1'])
+
+    def test_values_by_fault(self):
+        values = {'sensor':[1, 2], 'zon2_temp':[5], 'fan_eff':[0.5]}
+        listed = runs({'values':values, 'fault_times':[0], 'baseline':False}, info)
+        self.assertEqual([(run['fault'], run['value']) for run in listed],
+                         [('fan_eff', 0.5), ('zon1_temp', 1), ('zon1_temp', 2), ('zon2_temp', 5)])
+
+    def test_unknown_fault(self):
+        with self.assertRaises(ValueError):
+            runs({'faults':['zon3_temp'], 'values':[1], 'fault_times':[0]}, info)
+        with self.assertRaises(ValueError):
+            runs({'faults':['zon1_out'], 'values':[1], 'fault_times':[0]}, info)
+
+    def test_scenario(self):
+        run = {'run':'run1', 'fault':'zon1_temp', 'value':2, 'fault_time':60}
+        self.assertEqual(scenario(run, info), {'zon1_set':{'name':'zon1_set'},
+                                               'zon1_out':{'name':'zon1_out'},
+                                               'zon1_temp':{'value':2, 'fault_time':60}})
+        run = {'run':'run0', 'fault':None, 'value':None, 'fault_time':None}
+        self.assertEqual(sorted(scenario(run, info)), ['zon1_out', 'zon1_set'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the functions of the test case that do not simulate, see
+``model/testcase.py``. They run without pyfmi and the compiler, which are
+replaced by empty modules if they are not installed.
+
+"""
+
+import os
+import sys
+import types
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model'))
+for module, name in (('pyfmi', 'load_fmu'), ('pymodelica', 'compile_fmu')):
+    try:
+        __import__(module)
+    except ImportError:
+        sys.modules[module] = types.ModuleType(module)
+        setattr(sys.modules[module], name, None)
+from testcase import TestCase, InputMapper, _process_trajectory
+
+
+class ProcessTrajectoryTest(unittest.TestCase):
+    '''Tests the input objects of ``advance_batch``.'''
+
+    start_times = np.array([0., 60., 120.])
+    final_times = np.array([60., 120., 180.])
+
+    def process(self, trajectory, initial, scheduled=None):
+        return _process_trajectory(trajectory, self.start_times, self.final_times, initial, scheduled)
+
+    def test_step_changes(self):
+        u_list, u_trajectory = self.process({'time':[0, 60, 120], 'u':[1, 2, 3]}, {'u':0})
+        self.assertEqual(u_list, ['u'])
+        # Each value at both ends of its step
+        np.testing.assert_array_equal(u_trajectory[:, 0], [0, 60, 60, 120, 120, 180])
+        np.testing.assert_array_equal(u_trajectory[:, 1], [1, 1, 2, 2, 3, 3])
+
+    def test_hold(self):
+        u_list, u_trajectory = self.process({'time':[0, 90], 'u':[None, 4.]}, {'u':5})
+        # Initial value until the first value, applied from the next step start
+        np.testing.assert_array_equal(u_trajectory[::2, 1], [5, 5, 4])
+        u_list, u_trajectory = self.process({'time':[0, 60, 120], 'u':[1, float('nan'), None]}, {'u':5})
+        np.testing.assert_array_equal(u_trajectory[::2, 1], [1, 1, 1])
+
+    def test_before_first_time(self):
+        u_list, u_trajectory = self.process({'time':[100], 'u':[2]}, {'u':7})
+        np.testing.assert_array_equal(u_trajectory[::2, 1], [7, 7, 2])
+
+    def test_zero(self):
+        u_list, u_trajectory = self.process({'time':[0], 'u':[0]}, {'u':7})
+        np.testing.assert_array_equal(u_trajectory[::2, 1], [0, 0, 0])
+
+    def test_scheduled(self):
+        scheduled = {'u':np.array([1., np.nan, 3.]), 'v':np.array([np.nan, 8., np.nan])}
+        u_list, u_trajectory = self.process({'time':[60], 'u':[2]}, {'u':0, 'v':9}, scheduled)
+        self.assertEqual(u_list, ['u', 'v'])
+        # The trajectory takes precedence over the schedule
+        np.testing.assert_array_equal(u_trajectory[::2, 1], [1, 2, 2])
+        np.testing.assert_array_equal(u_trajectory[::2, 2], [9, 8, 8])
+
+    def test_nothing_written(self):
+        self.assertIsNone(self.process({'time':[0], 'u':[None]}, {'u':0}))
+        self.assertIsNone(self.process({'time':[]}, {}))
+
+
+class InputMapperTest(unittest.TestCase):
+    '''Tests the input objects of ``advance``.'''
+
+    def setUp(self):
+        self.mapper = InputMapper(['a', 'b', 'c'])
+
+    def test_written(self):
+        u_list, u_trajectory = self.mapper({'c':3, 'a':'1.5'}, 60)
+        self.assertEqual(u_list, ['a', 'c'])
+        np.testing.assert_array_equal(u_trajectory, [[60, 1.5, 3]])
+
+    def test_zero(self):
+        # Zero is written, absent, None, empty and NaN values are not
+        u_list, u_trajectory = self.mapper({'a':0, 'b':None, 'c':''}, 0)
+        self.assertEqual(u_list, ['a'])
+        np.testing.assert_array_equal(u_trajectory, [[0, 0]])
+        u_list, u_trajectory = self.mapper({'a':float('nan'), 'b':0.}, 0)
+        self.assertEqual(u_list, ['b'])
+
+    def test_nothing_written(self):
+        self.assertIsNone(self.mapper({}, 0))
+        self.assertIsNone(self.mapper({'a':None, 'unknown':1}, 0))
+
+    def test_previous_step(self):
+        # Values of a previous step are not written again
+        self.mapper({'a':1, 'b':2}, 0)
+        u_list, u_trajectory = self.mapper({'b':5}, 60)
+        self.assertEqual(u_list, ['b'])
+        np.testing.assert_array_equal(u_trajectory, [[60, 5]])
+
+
+class NextBoundaryTest(unittest.TestCase):
+    '''Tests the ends of the steps aligned with faults and events.'''
+
+    def case(self, step_align=True, scenario=None, events=None, schedule_events=None):
+        '''Returns a test case with steps of 60 s from 30 s, without fmu.'''
+
+        case = TestCase.__new__(TestCase)
+        case.step = 60
+        case.step_align = step_align
+        case.step_origin = 30
+        case.scenario = scenario or {}
+        case.con = {'events':events}
+        case.schedule_events = schedule_events or []
+        return case._TestCase__next_boundary
+
+    def test_grid(self):
+        next_boundary = self.case()
+        self.assertEqual(next_boundary(30), 90)
+        self.assertEqual(next_boundary(45), 90)
+        # Times within rounding of a boundary belong to the previous step
+        self.assertEqual(next_boundary(90 - 1e-12), 150)
+        self.assertEqual(next_boundary(0), 30)
+
+    def test_not_aligned(self):
+        self.assertEqual(self.case(step_align=False)(45), 105)
+
+    def test_fault_time(self):
+        scenario = {'zon1_temp':{'value':1, 'fault_time':100},
+                    'zon1_set':{'name':'zon1_set'}}
+        next_boundary = self.case(scenario=scenario)
+        self.assertEqual(next_boundary(90), 100)
+        self.assertEqual(next_boundary(100), 150)
+
+    def test_events(self):
+        next_boundary = self.case(events=[40, 200], schedule_events=[120])
+        self.assertEqual(next_boundary(30), 40)
+        self.assertEqual(next_boundary(40), 90)
+        self.assertEqual(next_boundary(90), 120)
+        self.assertEqual(next_boundary(150), 200)
+        self.assertEqual(next_boundary(200), 210)
+
+
+if __name__ == '__main__':
+    unittest.main()